@@ -1,16 +1,38 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_file, make_response
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, make_response, Response, stream_with_context, has_request_context, g, abort
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate, stamp
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from functools import wraps
 from flask_wtf.csrf import CSRFProtect
 from flask_mail import Mail, Message
 from itsdangerous import URLSafeTimedSerializer
 import os
+import random
 from dotenv import load_dotenv
 import csv
-from io import StringIO, BytesIO
+import json
+import logging
+import sys
+import base64
+import atexit
+import hashlib
+import hmac
+import threading
+import time
+import click
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+from io import StringIO
+from sqlalchemy import event, tuple_
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError, TimeoutError as SQLAlchemyTimeoutError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm.exc import StaleDataError
 
 # Load environment variables
 load_dotenv()
@@ -20,6 +42,18 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
 app.config['WTF_CSRF_CHECK_DEFAULT'] = False  # Disable CSRF for GET requests
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=10)
+app.config['DASHBOARD_CACHE_SIZE'] = int(os.getenv('DASHBOARD_CACHE_SIZE', 1024))
+app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 1024))
+app.config['USER_CACHE_TTL'] = float(os.getenv('USER_CACHE_TTL', 30))  # Seconds
+# Touched whenever users must be reloaded in every process (password reset, user deletion)
+app.config['USER_CACHE_STAMP'] = os.getenv('USER_CACHE_STAMP', os.path.join(app.instance_path, 'user_cache.stamp'))
+# Exchange rates are stored as the value of one unit of each currency in FX_BASE_CURRENCY
+app.config['FX_BASE_CURRENCY'] = os.getenv('FX_BASE_CURRENCY', 'USD')
+app.config['FX_CACHE_TTL'] = float(os.getenv('FX_CACHE_TTL', 3600))  # Seconds before rates loaded by another process show up
+# Password hashing: 'pbkdf2:<digest>' or 'scrypt', with its cost (pbkdf2 iterations or scrypt N, 0 for Werkzeug's default)
+app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+app.config['PASSWORD_HASH_COST'] = int(os.getenv('PASSWORD_HASH_COST', 0))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))  # Hashes computed at once per process
 
 # Email configuration
 app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
@@ -28,11 +62,89 @@ app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'True').lower() == 'true'
 app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
 app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER')
+# Outbound mail is queued in the database and sent by a background worker
+app.config['MAIL_QUEUE_WORKER'] = os.getenv('MAIL_QUEUE_WORKER', 'True').lower() == 'true'  # False when `flask drain-mail --loop` runs separately
+app.config['MAIL_QUEUE_BATCH_SIZE'] = int(os.getenv('MAIL_QUEUE_BATCH_SIZE', 50))  # Messages sent per SMTP connection
+app.config['MAIL_QUEUE_POLL_INTERVAL'] = float(os.getenv('MAIL_QUEUE_POLL_INTERVAL', 30))  # Seconds between checks for due retries
+app.config['MAIL_QUEUE_LEASE'] = float(os.getenv('MAIL_QUEUE_LEASE', 300))  # Seconds before a claimed message is retried by another worker
+app.config['MAIL_RETRY_DELAY'] = float(os.getenv('MAIL_RETRY_DELAY', 60))  # Seconds before the first retry, doubling each attempt
+app.config['MAIL_RETRY_MAX_DELAY'] = float(os.getenv('MAIL_RETRY_MAX_DELAY', 3600))
+app.config['MAIL_MAX_ATTEMPTS'] = int(os.getenv('MAIL_MAX_ATTEMPTS', 8))
+
+# Request instrumentation: query counts and SQL time per request in a Server-Timing header and a JSON access log
+app.config['SQL_INSTRUMENTATION'] = os.getenv('SQL_INSTRUMENTATION', 'False').lower() == 'true'
+app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 0))  # Log statements slower than this, 0 to disable
+# Prometheus metrics at /metrics; each process writes its samples to METRICS_DIR and a scrape merges them
+app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+app.config['METRICS_DIR'] = os.getenv('PROMETHEUS_MULTIPROC_DIR', os.path.join(app.instance_path, 'metrics'))
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')  # Bearer token /metrics requires; /metrics is not served without one
+
+# SQLite engine profile, applied to every new connection by apply_sqlite_pragmas()
+# WAL lets readers carry on while another process writes, and busy_timeout makes a writer wait for the lock
+# instead of failing with "database is locked"
+app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')  # In WAL mode only a power cut can lose the latest commits
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))  # Milliseconds
+app.config['SQLITE_CACHE_SIZE'] = int(os.getenv('SQLITE_CACHE_SIZE', 16384))  # KiB of page cache per connection
+app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))  # Bytes read through mmap, 0 to disable
+# Connections kept per process; DB_POOL_SIZE should cover the request threads of each mod_wsgi process
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),  # Whole seconds a request waits for a free connection
+}
+if app.config['SQLALCHEMY_DATABASE_URI'] and make_url(app.config['SQLALCHEMY_DATABASE_URI']).database in (None, '', ':memory:'):
+    # In-memory databases share a single connection, so there is no pool to size
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+
+# Metrics
+# prometheus_client chooses its multiprocess mode from PROMETHEUS_MULTIPROC_DIR when it is imported,
+# so the directory is set up first. Every process leaves its files behind, so the flask CLI, including
+# `flask run`, keeps its samples in memory instead of adding files on every cron run.
+METRICS_MULTIPROCESS = app.config['METRICS_ENABLED'] and click.get_current_context(silent=True) is None
+if METRICS_MULTIPROCESS:
+    os.makedirs(app.config['METRICS_DIR'], exist_ok=True)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = app.config['METRICS_DIR']
+else:
+    os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+REQUEST_COUNT = Counter('http_requests_total', 'Requests handled', ['endpoint', 'method', 'status'])
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Time to handle a request, streamed body included',
+                            ['endpoint', 'method'],
+                            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+DB_POOL_CHECKOUTS = Counter('db_pool_checkouts_total', 'Connections checked out of the pool')
+DB_POOL_WAIT = Histogram('db_pool_wait_seconds', 'Time spent waiting for a pooled connection',
+                         buckets=(0.0001, 0.001, 0.01, 0.1, 0.5, 1, 5, 30))
+DB_POOL_TIMEOUTS = Counter('db_pool_timeouts_total', 'Checkouts that gave up after DB_POOL_TIMEOUT')
+DB_POOL_IN_USE = Gauge('db_pool_connections_in_use', 'Connections checked out in live processes',
+                       multiprocess_mode='livesum')
+CACHE_LOOKUPS = Counter('cache_lookups_total', 'In-process cache lookups', ['cache', 'result'])
+EXPORT_BYTES = Counter('export_bytes_total', 'CSV bytes streamed by the export routes', ['export'])
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except SQLAlchemyTimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+if app.config['METRICS_ENABLED'] and app.config['SQLALCHEMY_ENGINE_OPTIONS']:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS']['poolclass'] = MeteredQueuePool
 
 # Add min function to Jinja2 environment
 app.jinja_env.globals.update(min=min)
 
 db = SQLAlchemy()
+migrate = Migrate(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'),
+                  render_as_batch=True)  # SQLite needs batch mode to alter tables
 csrf = CSRFProtect()
 mail = Mail()
 csrf.init_app(app)
@@ -40,8 +152,39 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 db.init_app(app)
+migrate.init_app(app, db)
 mail.init_app(app)
 
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the SQLite engine profile from the config to a new connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        # Set first so switching the journal mode waits for other processes too
+        cursor.execute(f"PRAGMA busy_timeout = {int(app.config['SQLITE_BUSY_TIMEOUT'])}")
+        cursor.execute(f"PRAGMA journal_mode = {app.config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous = {app.config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA cache_size = -{int(app.config['SQLITE_CACHE_SIZE'])}")  # Negative sizes are in KiB
+        cursor.execute(f"PRAGMA mmap_size = {int(app.config['SQLITE_MMAP_SIZE'])}")
+    finally:
+        cursor.close()
+
+def count_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKOUTS.inc()
+    DB_POOL_IN_USE.inc()
+
+def count_checkin(dbapi_connection, connection_record):
+    DB_POOL_IN_USE.dec()
+
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', apply_sqlite_pragmas)
+    if app.config['METRICS_ENABLED']:
+        event.listen(db.engine, 'checkout', count_checkout)
+        event.listen(db.engine, 'checkin', count_checkin)
+if METRICS_MULTIPROCESS:
+    # Drops this process's live gauges, such as connections in use, from the merged values
+    atexit.register(lambda: multiprocess.mark_process_dead(os.getpid()))
+
 # Customize the unauthorized handler to not flash a message when accessing the login page directly
 @login_manager.unauthorized_handler
 def unauthorized():
@@ -61,13 +204,170 @@ SUPPORTED_CURRENCIES = {
     'ZAR': 'South African Rand'
 }
 
+# Pagination configuration
+TRANSACTIONS_PER_PAGE = 50
+MAX_TRANSACTIONS_PER_PAGE = 200
+
+# Months of history the analytics endpoints return by default and at most
+ANALYTICS_MONTHS = 12
+MAX_ANALYTICS_MONTHS = 60
+
+# Rows fetched from the database and written to the response per export chunk
+EXPORT_CHUNK_ROWS = 1000
+
+# Transactions inserted per executemany batch by the bulk importer
+IMPORT_CHUNK_ROWS = 5000
+IMPORT_FIELDS = ('date', 'type', 'amount', 'description', 'category', 'source', 'currency')
+MAX_IMPORT_ERRORS = 100  # Row errors reported back before the rest are summarised
+
+# Rows written per executemany batch and users per commit by `flask seed`
+SEED_BATCH_ROWS = 10000
+SEED_USERS_PER_CHUNK = 100
+
+# Archived budgets or transactions moved to the archive tables per batch
+ARCHIVE_BATCH_ROWS = 1000
+
+# Times a balance update is retried when another writer changed the balance first
+BALANCE_UPDATE_ATTEMPTS = 5
+
+# Caching
+class LRUCache:
+    """
+    Thread-safe, size-bounded cache that evicts the least recently used entry
+    Entries can carry a version; a lookup with a different version counts as a miss
+    """
+
+    def __init__(self, max_size=1024, ttl=None, name=None):
+        self.max_size = max_size
+        self.ttl = ttl  # Seconds an entry stays valid, or None to keep it until evicted
+        self.name = name  # Label for the cache_lookups_total metric, or None to leave it out
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, entry_version, expires_at = entry
+                if entry_version == version and (expires_at is None or expires_at > time.monotonic()):
+                    self._entries.move_to_end(key)
+                    if self.name:
+                        CACHE_LOOKUPS.labels(self.name, 'hit').inc()
+                    return value
+                del self._entries[key]
+            if self.name:
+                CACHE_LOOKUPS.labels(self.name, 'miss').inc()
+            return None
+
+    def set(self, key, value, version=None):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, version, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Dashboard summaries per user, validated against User.data_version
+dashboard_cache = LRUCache(max_size=app.config['DASHBOARD_CACHE_SIZE'], name='dashboard')
+
+# Users loaded by load_user, validated against the auth_version stored in the session
+user_cache = LRUCache(max_size=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'], name='user')
+user_cache_stamp = None
+
+# Exchange rates by date, refreshed after FX_CACHE_TTL so rates loaded by other processes are picked up
+fx_rate_cache = LRUCache(max_size=366, ttl=app.config['FX_CACHE_TTL'], name='fx_rate')
+
+# Money
+MINOR_UNITS = 100  # Ngwee per kwacha, cents per dollar; every supported currency has two decimal places
+MONEY_QUANTUM = Decimal('0.01')
+
+def parse_money(value):
+    """Parse an entered amount into a Decimal rounded to two places; raises ValueError if it is not a number"""
+    try:
+        amount = Decimal(str(value).strip().replace(',', ''))
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {value}')
+    if not amount.is_finite():
+        raise ValueError(f'Invalid amount: {value}')
+    return amount.quantize(MONEY_QUANTUM, rounding=ROUND_HALF_UP)
+
+def to_minor_units(value):
+    """Amount in integer minor units, as stored in Money columns"""
+    return int(parse_money(value) * MINOR_UNITS)
+
+class Money(db.TypeDecorator):
+    """
+    An amount stored as integer minor units (ngwee, cents) and exposed as a Decimal with two places
+    SUM() and comparisons run on exact integers in the database.
+    """
+    impl = db.Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_minor_units(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else Decimal(int(value)).scaleb(-2)
+
+# Password hashing
+# Werkzeug's costs, used when PASSWORD_HASH_COST is 0
+DEFAULT_PBKDF2_ITERATIONS = 600000
+DEFAULT_SCRYPT_N = 32768
+
+password_hash_pool = None
+password_hash_pool_lock = threading.Lock()
+
+def password_hash_method():
+    """Configured method in Werkzeug's format, which is also the prefix of every hash it produces"""
+    method = app.config['PASSWORD_HASH_METHOD']
+    cost = app.config['PASSWORD_HASH_COST']
+    if method == 'scrypt':
+        return f'scrypt:{cost or DEFAULT_SCRYPT_N}:8:1'
+    return f'{method}:{cost or DEFAULT_PBKDF2_ITERATIONS}'
+
+def run_password_hash(fn, *args):
+    """
+    Run a hashing function on the process's bounded hashing pool and wait for the result
+    hashlib releases the GIL while hashing, so other requests keep running and a login burst
+    occupies at most PASSWORD_HASH_WORKERS cores.
+    """
+    global password_hash_pool
+    if password_hash_pool is None:
+        with password_hash_pool_lock:
+            # Created on first use so each worker process gets its own threads
+            if password_hash_pool is None:
+                password_hash_pool = ThreadPoolExecutor(max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                                                        thread_name_prefix='password-hash')
+    return password_hash_pool.submit(fn, *args).result()
+
+def hash_password(password):
+    return run_password_hash(generate_password_hash, password, password_hash_method())
+
+def verify_password(password_hash, password):
+    return run_password_hash(check_password_hash, password_hash, password)
+
+def password_needs_rehash(password_hash):
+    """Whether a stored hash was made with a different method or cost than the configured one"""
+    return not password_hash or password_hash.split('$', 1)[0] != password_hash_method()
+
 # Models
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(255))
     default_currency = db.Column(db.String(3), default='ZMW')
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped on every write to the user's financial data
+    auth_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped on every password change
+    category_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped whenever the user's category list changes
     transactions = db.relationship('Transaction', backref='user', lazy=True)
     budgets = db.relationship('Budget', backref='user', lazy=True)
     savings = db.relationship('Saving', backref='user', lazy=True)
@@ -75,10 +375,19 @@ class User(UserMixin, db.Model):
     categories = db.relationship('Category', backref='user', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
+        self.auth_version = (self.auth_version or 0) + 1
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return bool(self.password_hash) and verify_password(self.password_hash, password)
+
+    def upgrade_password_hash(self, password):
+        """Rehash a just-verified password if its hash predates the configured method or cost"""
+        if not password_needs_rehash(self.password_hash):
+            return False
+        # Same password, so existing sessions stay valid and auth_version is left alone
+        self.password_hash = hash_password(password)
+        return True
         
     def get_reset_token(self):
         """Generate a password reset token"""
@@ -89,7 +398,7 @@ class User(UserMixin, db.Model):
         """Verify the password reset token"""
         try:
             email = serializer.loads(token, salt='password-reset-salt', max_age=max_age)
-            return User.query.filter_by(email=email).first()
+            return user_by_email_query(email).first()
         except:
             return None
 
@@ -97,10 +406,18 @@ class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     type = db.Column(db.String(50), nullable=False)  # 'income' or 'expense'
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # NULL for the shared default categories
     is_default = db.Column(db.Boolean, default=False)  # New field to distinguish default categories
+    overrides_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)  # Shared category this row replaces for its user
+    hidden = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())  # Hides overrides_id without replacing it
     transactions = db.relationship('Transaction', backref='category', lazy=True)
     budget_items = db.relationship('BudgetItem', backref='category', lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_category_user_type_name', 'user_id', 'type', 'name'),
+        # Override lookup when merging the shared categories into a user's list
+        db.Index('ix_category_user_overrides', 'user_id', 'overrides_id'),
+    )
     
     @staticmethod
     def get_default_categories():
@@ -132,7 +449,7 @@ class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     type = db.Column(db.String(50), nullable=False)  # 'income' or 'expense'
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
     description = db.Column(db.String(200))
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)  # Made nullable
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -140,10 +457,23 @@ class Transaction(db.Model):
     source = db.Column(db.String(20), nullable=False)  # 'bank', 'mobile_money', or 'cash'
     archived = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        # Transactions list: user + currency + archived, newest first
+        db.Index('ix_transaction_user_currency_archived_date', 'user_id', 'currency', 'archived', 'date'),
+        # Dashboard recent transactions and CSV export: user, newest first
+        db.Index('ix_transaction_user_date', 'user_id', 'date'),
+        # Category in-use check before deleting a category
+        db.Index('ix_transaction_category_user', 'category_id', 'user_id'),
+        # Archived rows waiting to be moved to archived_transaction
+        db.Index('ix_transaction_archived_pending', 'id', sqlite_where=db.text('archived = 1')),
+        # Ids are never reused, so they stay unique across the hot and archive tables
+        {'sqlite_autoincrement': True},
+    )
+
 class Budget(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     month = db.Column(db.Date, nullable=False)
-    total_amount = db.Column(db.Float, nullable=False)
+    total_amount = db.Column(Money, nullable=False)
     currency = db.Column(db.String(3), nullable=False, default='ZMW')
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     items = db.relationship('BudgetItem', backref='budget', lazy=True)
@@ -151,37 +481,460 @@ class Budget(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_budget_user_month_archived', 'user_id', 'month', 'archived'),
+        # Archived budgets waiting to be moved to archived_budget
+        db.Index('ix_budget_archived_pending', 'id', sqlite_where=db.text('archived = 1')),
+        {'sqlite_autoincrement': True},
+    )
+
 class BudgetItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     budget_id = db.Column(db.Integer, db.ForeignKey('budget.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
-    planned_amount = db.Column(db.Float, nullable=False)
-    spent_amount = db.Column(db.Float, default=0.0)
+    planned_amount = db.Column(Money, nullable=False)
+    spent_amount = db.Column(Money, default=0)
     archived = db.Column(db.Boolean, default=False)
     description = db.Column(db.String(200))  # New field for other expenses description
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Optimistic concurrency counter
+
+    __mapper_args__ = {'version_id_col': version}
+
+    __table_args__ = (
+        db.Index('ix_budget_item_budget_category_archived', 'budget_id', 'category_id', 'archived'),
+        # Category in-use check before deleting a category
+        db.Index('ix_budget_item_category', 'category_id'),
+        {'sqlite_autoincrement': True},
+    )
+
+# Archive tables
+# Archived budgets and transactions are moved here by archive_rows() so the hot tables only hold live data.
+# Rows keep their original ids and columns.
+class ArchivedTransaction(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    date = db.Column(db.DateTime, nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    amount = db.Column(Money, nullable=False)
+    description = db.Column(db.String(200))
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    source = db.Column(db.String(20), nullable=False)
+    category = db.relationship('Category')
+
+    __table_args__ = (
+        db.Index('ix_archived_transaction_user_date', 'user_id', 'date'),
+        db.Index('ix_archived_transaction_category_user', 'category_id', 'user_id'),
+    )
+
+class ArchivedBudget(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    month = db.Column(db.Date, nullable=False)
+    total_amount = db.Column(Money, nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    items = db.relationship('ArchivedBudgetItem', backref='budget', lazy=True, order_by='ArchivedBudgetItem.id')
+    archived = True  # Same interface as Budget for templates and exports
+
+    __table_args__ = (
+        db.Index('ix_archived_budget_user_month', 'user_id', 'month'),
+    )
+
+class ArchivedBudgetItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    budget_id = db.Column(db.Integer, db.ForeignKey('archived_budget.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    planned_amount = db.Column(Money, nullable=False)
+    spent_amount = db.Column(Money)
+    archived = db.Column(db.Boolean, nullable=False, default=False)  # BudgetItem.archived when it was moved
+    description = db.Column(db.String(200))
+    category = db.relationship('Category')
+
+    __table_args__ = (
+        db.Index('ix_archived_budget_item_budget_category', 'budget_id', 'category_id'),
+    )
 
 class Saving(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(20), nullable=False)  # 'bank', 'mobile_money', 'cash'
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(Money, nullable=False)
     currency = db.Column(db.String(3), nullable=False, default='ZMW')
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     description = db.Column(db.String(200))
     date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Latest balance per source: user + type, newest first
+        db.Index('ix_saving_user_type_date', 'user_id', 'type', 'date'),
+        # Most recent saving of any type
+        db.Index('ix_saving_user_date', 'user_id', 'date'),
+    )
+
+class AccountBalance(db.Model):
+    """Current balance of one source in one currency, kept in step with the Saving log"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    source = db.Column(db.String(20), primary_key=True)  # 'bank', 'mobile_money', 'cash'
+    currency = db.Column(db.String(3), primary_key=True)
+    amount = db.Column(Money, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Optimistic concurrency counter
+
+    __mapper_args__ = {'version_id_col': version}
+
 class Investment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(50), nullable=False)  # 'stocks', 'bonds', 'tbills', etc.
-    initial_value = db.Column(db.Float, nullable=False)
-    current_value = db.Column(db.Float, nullable=False)
+    initial_value = db.Column(Money, nullable=False)
+    current_value = db.Column(Money, nullable=False)
     currency = db.Column(db.String(3), nullable=False, default='ZMW')
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     description = db.Column(db.String(200))
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_investment_user', 'user_id'),
+    )
+
+class FxRate(db.Model):
+    currency = db.Column(db.String(3), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    rate = db.Column(db.Float, nullable=False)  # Value of one unit of currency in FX_BASE_CURRENCY
+
+class ReconciledMonth(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)  # User.data_version when reconcile-spent last checked this month
+
+class OutboundMail(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text, nullable=False)  # Comma-separated addresses
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.now)  # NULL once delivery has been given up
+    last_error = db.Column(db.String(500))
+
+    __table_args__ = (
+        # Due messages, oldest first
+        db.Index('ix_outbound_mail_next_attempt', 'next_attempt_at'),
+    )
+
+def user_data_version(user):
+    """
+    Latest data version known for a user
+    The session remembers the version after this browser's last write, which may be newer than a cached user
+    """
+    session_version = session.get('data_version', 0) if has_request_context() else 0
+    return max(user.data_version or 0, session_version)
+
+def mark_user_data_changed(user_id):
+    """Bump the user's data version in the current transaction and drop their cached dashboard summary"""
+    if has_request_context() and current_user.is_authenticated and current_user.id == user_id:
+        session['data_version'] = user_data_version(current_user) + 1
+    db.session.execute(
+        db.update(User).where(User.id == user_id).values(data_version=User.data_version + 1)
+    )
+    dashboard_cache.invalidate(user_id)
+
+def current_category_version(user):
+    """Category version read from the database, since the cached user may predate the last change"""
+    return db.session.scalar(db.select(User.category_version).where(User.id == user.id)) or 0
+
+def mark_categories_changed(user_id):
+    """Bump the user's category version in the current transaction"""
+    db.session.execute(
+        db.update(User).where(User.id == user_id).values(category_version=User.category_version + 1)
+    )
+
+def user_categories_query(user_id, type=None):
+    """
+    Categories visible to a user, ordered by type and name
+    The union of the user's own rows with the shared defaults they have not overridden or hidden.
+    """
+    override = db.aliased(Category)
+    own = db.select(Category).where(Category.user_id == user_id, Category.hidden == False)
+    shared = db.select(Category).where(
+        Category.user_id.is_(None),
+        ~db.select(override.id).where(override.user_id == user_id, override.overrides_id == Category.id).exists()
+    )
+    if type:
+        own = own.where(Category.type == type)
+        shared = shared.where(Category.type == type)
+    visible = db.aliased(Category, db.union_all(own, shared).subquery('visible_category'))
+    return db.session.query(visible).order_by(visible.type, visible.name)
+
+def hidden_categories_query(user_id):
+    """The user's hidden flags on shared categories"""
+    return Category.query.filter_by(user_id=user_id, hidden=True)
+
+def user_category_by_name_query(user_id, type, name):
+    return user_categories_query(user_id, type).filter_by(name=name)
+
+def category_usage_queries(user_id, category_id):
+    """
+    A user's transactions and budget items in a category, archived ones included
+    Budget items are reached through the user's budgets since shared categories span every user.
+    """
+    return [
+        Transaction.query.filter_by(category_id=category_id, user_id=user_id),
+        ArchivedTransaction.query.filter_by(category_id=category_id, user_id=user_id),
+        BudgetItem.query.filter(
+            BudgetItem.budget_id.in_(db.select(Budget.id).where(Budget.user_id == user_id)),
+            BudgetItem.category_id == category_id
+        ),
+        ArchivedBudgetItem.query.filter(
+            ArchivedBudgetItem.budget_id.in_(db.select(ArchivedBudget.id).where(ArchivedBudget.user_id == user_id)),
+            ArchivedBudgetItem.category_id == category_id
+        ),
+    ]
+
+def create_shared_categories():
+    """Insert any default category missing from the shared set, returning how many were added"""
+    existing = set(db.session.execute(db.select(Category.type, Category.name).where(Category.user_id.is_(None))))
+    missing = [
+        {'name': c['name'], 'type': c['type'], 'user_id': None, 'is_default': True}
+        for c in Category.get_default_categories() if (c['type'], c['name']) not in existing
+    ]
+    if missing:
+        db.session.execute(db.insert(Category), missing)
+    return len(missing)
+
+class InsufficientFundsError(Exception):
+    """Raised when a balance update would take a source below zero"""
+
+def write_balance(user_id, source, currency, compute, description, allow_negative=True):
+    """
+    Update a source's balance and append it to the Saving log, in the current transaction
+    compute(current_amount) returns the new amount. The update only applies if the balance still has the
+    version that was read, and is retried with a fresh read if another writer got there first.
+    Returns the new amount.
+    """
+    key = {'user_id': user_id, 'source': source, 'currency': currency}
+    for _ in range(BALANCE_UPDATE_ATTEMPTS):
+        current = db.session.execute(
+            db.select(AccountBalance.amount, AccountBalance.version).filter_by(**key)
+        ).first()
+        amount = compute(current.amount if current else Decimal(0))
+        if amount < 0 and not allow_negative:
+            raise InsufficientFundsError(f'Insufficient funds in {source}')
+        
+        now = datetime.utcnow()
+        if current is None:
+            try:
+                db.session.execute(db.insert(AccountBalance).values(amount=amount, version=1, updated_at=now, **key))
+            except IntegrityError:
+                continue  # Another writer created the balance first
+        else:
+            result = db.session.execute(
+                db.update(AccountBalance)
+                .filter_by(version=current.version, **key)
+                .values(amount=amount, version=current.version + 1, updated_at=now)
+            )
+            if result.rowcount != 1:
+                continue  # Another writer changed the balance since we read it
+        
+        db.session.add(Saving(
+            type=source,
+            amount=amount,
+            currency=currency,
+            description=description,
+            user_id=user_id,
+            date=now
+        ))
+        return amount
+    
+    raise StaleDataError(f'Balance for {source} kept changing after {BALANCE_UPDATE_ATTEMPTS} attempts')
+
+def set_balance(user_id, source, currency, amount, description):
+    """Set a source's balance and append it to the Saving log, in the current transaction"""
+    return write_balance(user_id, source, currency, lambda current_amount: amount, description)
+
+def adjust_balance(user_id, source, currency, delta, description, allow_negative=True):
+    """Add delta to a source's balance and append the result to the Saving log, in the current transaction"""
+    return write_balance(user_id, source, currency, lambda current_amount: current_amount + delta,
+                         description, allow_negative=allow_negative)
+
+def add_spent_amount(budget_item, delta):
+    """
+    Add delta to a budget item's spent amount in a single UPDATE, so concurrent writers cannot lose updates
+    Returns the new spent amount
+    """
+    db.session.execute(
+        db.update(BudgetItem)
+        .where(BudgetItem.id == budget_item.id)
+        .values(spent_amount=db.func.coalesce(BudgetItem.spent_amount, 0) + delta, version=BudgetItem.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.expire(budget_item, ['spent_amount', 'version'])
+    return budget_item.spent_amount
+
+# Spent amount reconciliation
+def month_bounds(month):
+    """First day of month's month and of the month after it"""
+    start = month.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+def spent_amount_drift_query(month, user_ids=None):
+    """
+    Active budget items of a month whose spent amount differs from the sum of their expense transactions
+    The month's expenses are summed with one GROUP BY user, category and joined to the budget items; user_ids
+    is a list or a subquery of user ids to limit it to, or None for every user.
+    """
+    start, end = month_bounds(month)
+    spent = db.session.query(
+        Transaction.user_id,
+        Transaction.category_id,
+        db.func.sum(Transaction.amount).label('actual')
+    ).filter(Transaction.type == 'expense', Transaction.date >= start, Transaction.date < end)
+    budgets = db.session.query(Budget.id, Budget.user_id)\
+        .filter(Budget.month == start, Budget.archived == False)
+    if user_ids is not None:
+        spent = spent.filter(Transaction.user_id.in_(user_ids))
+        budgets = budgets.filter(Budget.user_id.in_(user_ids))
+    spent = spent.group_by(Transaction.user_id, Transaction.category_id).subquery()
+    budgets = budgets.subquery()
+
+    actual = db.func.coalesce(spent.c.actual, 0)
+    return db.session.query(
+        BudgetItem.id,
+        BudgetItem.version,
+        BudgetItem.spent_amount,
+        actual.label('actual'),
+        budgets.c.user_id
+    ).join(budgets, budgets.c.id == BudgetItem.budget_id)\
+        .outerjoin(spent, db.and_(spent.c.user_id == budgets.c.user_id, spent.c.category_id == BudgetItem.category_id))\
+        .filter(BudgetItem.archived == False)\
+        .filter(db.func.coalesce(BudgetItem.spent_amount, 0) != actual)
+
+def reconcile_spent_amounts(month, user_ids=None):
+    """
+    Set drifted spent amounts of a month's budget items back to the sum of their transactions, in the current transaction
+    Each fix only applies if the item still has the version that was read. An item changed by another writer
+    is skipped; that writer also bumped the user's data_version, so the next run checks it again.
+    Returns (drifted rows, number fixed).
+    """
+    drifted = spent_amount_drift_query(month, user_ids).all()
+    if not drifted:
+        return drifted, 0
+
+    items = BudgetItem.__table__
+    result = db.session.execute(
+        items.update()
+        .where(items.c.id == db.bindparam('item_id'), items.c.version == db.bindparam('item_version', type_=db.Integer))
+        .values(spent_amount=db.bindparam('actual', type_=Money), version=db.bindparam('item_version', type_=db.Integer) + 1),
+        [{'item_id': row.id, 'item_version': row.version, 'actual': row.actual} for row in drifted]
+    )
+
+    # Same effect as mark_user_data_changed, one executemany for every affected user
+    users = User.__table__
+    user_ids = {row.user_id for row in drifted}
+    db.session.execute(
+        users.update().where(users.c.id == db.bindparam('changed_id')).values(data_version=users.c.data_version + 1),
+        [{'changed_id': user_id} for user_id in user_ids]
+    )
+    for user_id in user_ids:
+        dashboard_cache.invalidate(user_id)
+    if has_request_context() and current_user.is_authenticated and current_user.id in user_ids:
+        session['data_version'] = user_data_version(current_user) + 1
+    return drifted, result.rowcount
+
+def unreconciled_user_ids(month):
+    """Subquery of users whose data changed since reconcile-spent last checked month"""
+    mark = db.select(ReconciledMonth.version)\
+        .where(ReconciledMonth.user_id == User.id, ReconciledMonth.month == month.replace(day=1))\
+        .scalar_subquery()
+    return db.select(User.id).where(User.data_version > db.func.coalesce(mark, 0))
+
+def reconcile_changed_users(month, all_users=False):
+    """
+    Reconcile a month's spent amounts for users whose data changed since it was last checked, then advance
+    their high-water mark for that month only
+    Returns (users checked, drifted rows, number fixed)
+    """
+    users = db.session.query(User.id, User.data_version)
+    if not all_users:
+        users = users.filter(User.id.in_(unreconciled_user_ids(month)))
+    marks = dict(users.all())
+    if not marks:
+        return 0, [], 0
+
+    drifted, fixed = reconcile_spent_amounts(month, None if all_users else unreconciled_user_ids(month))
+
+    # Users with drifted items had their data_version bumped once more by us; anyone who wrote since the
+    # snapshot stays ahead of their mark and is checked again next run. INSERT OR REPLACE rather than an
+    # upsert, which needs SQLite 3.24.
+    bumped = {row.user_id for row in drifted}
+    db.session.execute(db.insert(ReconciledMonth).prefix_with('OR REPLACE'), [
+        {'user_id': user_id, 'month': month.replace(day=1), 'version': version + (user_id in bumped)}
+        for user_id, version in marks.items()
+    ])
+    return len(marks), drifted, fixed
+
+def latest_balances(user_id):
+    """Most recently updated balance per source, read from the materialized account_balance table"""
+    balances = {}
+    for balance in account_balances_query(user_id):
+        balances.setdefault(balance.source, balance)
+    return balances
+
+def investments_query(user_id):
+    return Investment.query.filter_by(user_id=user_id)
+
+def account_balances_query(user_id):
+    return AccountBalance.query.filter_by(user_id=user_id).order_by(AccountBalance.updated_at.desc())
+
+def sync_user_cache():
+    """Clear the user cache if another process has touched the shared stamp file since the last check"""
+    global user_cache_stamp
+    try:
+        stamp = os.stat(app.config['USER_CACHE_STAMP']).st_mtime_ns
+    except OSError:
+        stamp = 0
+    if stamp != user_cache_stamp:
+        user_cache.clear()
+        user_cache_stamp = stamp
+
+def invalidate_user_cache(user_id):
+    """Drop a user from this process's cache and tell the other processes to reload their users"""
+    user_cache.invalidate(user_id)
+    try:
+        os.makedirs(os.path.dirname(app.config['USER_CACHE_STAMP']), exist_ok=True)
+        with open(app.config['USER_CACHE_STAMP'], 'a'):
+            os.utime(app.config['USER_CACHE_STAMP'])
+    except OSError as e:
+        app.logger.warning(f'Could not touch user cache stamp: {str(e)}')
+
+def user_by_username_query(username):
+    return User.query.filter_by(username=username)
+
+def user_by_email_query(email):
+    return User.query.filter_by(email=email)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    auth_version = session.get('auth_version')
+    sync_user_cache()
+    
+    user = user_cache.get(user_id, version=auth_version)
+    if user is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        
+        # The password changed after this session logged in
+        if auth_version is not None and user.auth_version != auth_version:
+            return None
+        
+        # Keep a detached copy so commits in this request cannot expire the cached state
+        db.session.expunge(user)
+        user_cache.set(user_id, user, version=auth_version)
+    
+    return db.session.merge(user, load=False)
 
 def check_session_timeout():
     try:
@@ -210,6 +963,84 @@ def check_timeout(f):
         return f(*args, **kwargs)  # Allow the function to handle non-authenticated users
     return decorated_function
 
+# Request instrumentation
+# Nothing is registered unless SQL_INSTRUMENTATION, SLOW_QUERY_MS or METRICS_ENABLED is set, so it costs
+# nothing when disabled
+access_logger = app.logger.getChild('access')
+access_logger.setLevel(logging.INFO)
+slow_query_logger = app.logger.getChild('slow_query')
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    """Add a finished statement to the current request's totals and log it if it was slow"""
+    elapsed = time.perf_counter() - conn.info.pop('query_started', time.perf_counter())
+    endpoint = None
+    if has_request_context():
+        g.sql_queries = g.get('sql_queries', 0) + 1
+        g.sql_time = g.get('sql_time', 0.0) + elapsed
+        endpoint = request.endpoint
+    if app.config['SLOW_QUERY_MS'] and elapsed * 1000 >= app.config['SLOW_QUERY_MS']:
+        slow_query_logger.warning(json.dumps({
+            'event': 'slow_query',
+            'endpoint': endpoint,
+            'duration_ms': round(elapsed * 1000, 2),
+            'executemany': executemany,
+            'statement': ' '.join(statement.split()),
+        }))
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+def remember_status(response):
+    g.response_status = response.status_code
+    return response
+
+def add_server_timing(response):
+    """Report the SQL issued so far; a streamed body's queries only reach the access log"""
+    total = (time.perf_counter() - g.request_started) * 1000
+    response.headers.add('Server-Timing', f'db;dur={g.get("sql_time", 0.0) * 1000:.2f};desc="{g.get("sql_queries", 0)} queries"')
+    response.headers.add('Server-Timing', f'total;dur={total:.2f}')
+    return response
+
+def log_access(exc):
+    """Write one JSON line per request once it has finished, streamed responses included"""
+    if 'request_started' not in g:
+        return
+    access_logger.info(json.dumps({
+        'event': 'request',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': g.get('response_status', 500),
+        'user_id': session.get('_user_id'),
+        'duration_ms': round((time.perf_counter() - g.request_started) * 1000, 2),
+        'sql_queries': g.get('sql_queries', 0),
+        'sql_ms': round(g.get('sql_time', 0.0) * 1000, 2),
+    }))
+
+def observe_request(exc):
+    """Count the finished request and its latency, streamed responses included"""
+    if 'request_started' not in g:
+        return
+    endpoint = request.endpoint or 'unmatched'  # Requests that matched no route
+    REQUEST_COUNT.labels(endpoint, request.method, g.get('response_status', 500)).inc()
+    REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - g.request_started)
+
+if app.config['SQL_INSTRUMENTATION'] or app.config['SLOW_QUERY_MS']:
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', start_query_timer)
+        event.listen(db.engine, 'after_cursor_execute', record_query)
+if app.config['SQL_INSTRUMENTATION'] or app.config['METRICS_ENABLED']:
+    app.before_request(start_request_timer)
+    app.after_request(remember_status)
+if app.config['SQL_INSTRUMENTATION']:
+    app.after_request(add_server_timing)
+    app.teardown_request(log_access)
+if app.config['METRICS_ENABLED']:
+    app.teardown_request(observe_request)
+
 # Add context processor to provide current year to all templates
 @app.context_processor
 def inject_now():
@@ -221,7 +1052,7 @@ def money_format(value):
     try:
         if value is None:
             return "0.00"
-        return "{:,.2f}".format(float(value))
+        return "{:,.2f}".format(parse_money(value))
     except (ValueError, TypeError):
         return "0.00"
 
@@ -270,30 +1101,20 @@ def register():
             flash(error_message, 'error')
             return redirect(url_for('register'))
         
-        if User.query.filter_by(username=username).first():
+        if user_by_username_query(username).first():
             flash('Username already exists', 'error')
             return redirect(url_for('register'))
             
-        if User.query.filter_by(email=email).first():
+        if user_by_email_query(email).first():
             flash('Email already registered', 'error')
             return redirect(url_for('register'))
             
+        # New users see the shared default categories, so only the user row is written
         user = User(username=username, email=email)
         user.set_password(password)
         db.session.add(user)
         db.session.commit()
         
-        # Create default categories for the new user
-        default_categories = Category.get_default_categories()
-        for cat_data in default_categories:
-            category = Category(
-                name=cat_data['name'],
-                type=cat_data['type'],
-                user_id=user.id
-            )
-            db.session.add(category)
-        db.session.commit()
-        
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('login'))
         
@@ -305,10 +1126,13 @@ def login():
         return redirect(url_for('index'))
         
     if request.method == 'POST':
-        user = User.query.filter_by(username=request.form['username']).first()
+        user = user_by_username_query(request.form['username']).first()
         if user and user.check_password(request.form['password']):
+            if user.upgrade_password_hash(request.form['password']):
+                db.session.commit()
             login_user(user)
             session.permanent = True  # Enable session expiry
+            session['auth_version'] = user.auth_version
             session['last_activity'] = datetime.now().isoformat()
             next_page = request.args.get('next')
             return redirect(next_page or url_for('index'))
@@ -322,125 +1146,211 @@ def logout():
     flash('Logged out successfully!', 'success')
     return redirect(url_for('login'))
 
+# Exchange rates
+def fx_rates_query(day):
+    """Latest rate on or before day for each supported currency, one index seek per currency"""
+    latest = [
+        db.select(FxRate.currency, FxRate.rate)
+        .where(FxRate.currency == currency, FxRate.date <= day)
+        .order_by(FxRate.date.desc())
+        .limit(1)
+        .subquery()
+        for currency in SUPPORTED_CURRENCIES
+    ]
+    return db.session.query(db.union_all(*[db.select(rate) for rate in latest]).subquery())
+
+def fx_rates(day=None):
+    """Rate of each currency in FX_BASE_CURRENCY as of day (default today), cached per day"""
+    day = day or date.today()
+    rates = fx_rate_cache.get(day)
+    if rates is None:
+        rates = {row.currency: row.rate for row in fx_rates_query(day)}
+        rates[app.config['FX_BASE_CURRENCY']] = 1.0
+        fx_rate_cache.set(day, rates)
+    return rates
+
+def fx_factor(currency_column, target, rates):
+    """
+    SQL expression for the factor converting an amount in currency_column into target, or NULL without a rate
+    The rates are bound into a CASE, so a whole column is converted in the same pass as the aggregate reading it.
+    """
+    factors = {target: 1.0}
+    if target in rates:
+        for currency, rate in rates.items():
+            factors.setdefault(currency, rate / rates[target])
+    return db.case(
+        {currency: db.literal(factor, db.Float) for currency, factor in factors.items()},
+        value=currency_column,
+        else_=db.null()
+    )
+
+def converted_sum(money_column, currency_column, target, rates):
+    """SUM of a Money column converted into target currency, as Money; rows without a rate are left out"""
+    minor_units = db.type_coerce(money_column, db.Integer) * fx_factor(currency_column, target, rates)
+    return db.type_coerce(db.func.coalesce(db.func.round(db.func.sum(minor_units)), 0), Money)
+
+# Dashboard snapshot
+SAVING_SOURCES = ('bank', 'mobile_money', 'cash')
+
+def investment_totals_query(user_id, target, rates):
+    """Total market and initial value of a user's investments in target currency, with the number left unconverted"""
+    return db.session.query(
+        converted_sum(Investment.current_value, Investment.currency, target, rates).label('total_market_value'),
+        converted_sum(Investment.initial_value, Investment.currency, target, rates).label('total_initial_investment'),
+        (db.func.count() - db.func.count(fx_factor(Investment.currency, target, rates))).label('unconverted')
+    ).filter(Investment.user_id == user_id)
+
+def consolidated_balance_query(user_id, target, rates):
+    """All of a user's balances summed in target currency, with the number left unconverted"""
+    return db.session.query(
+        converted_sum(AccountBalance.amount, AccountBalance.currency, target, rates).label('total'),
+        (db.func.count() - db.func.count(fx_factor(AccountBalance.currency, target, rates))).label('unconverted')
+    ).filter(AccountBalance.user_id == user_id)
+
+def current_budget_query(user_id):
+    """Current month's budget with the total spent across its active items"""
+    current_month = date.today().replace(day=1)
+    return db.session.query(
+        Budget,
+        db.func.coalesce(db.func.sum(BudgetItem.spent_amount), 0).label('total_spent')
+    ).outerjoin(BudgetItem, db.and_(BudgetItem.budget_id == Budget.id, BudgetItem.archived == False))\
+        .filter(Budget.user_id == user_id, Budget.month == current_month, Budget.archived == False)\
+        .group_by(Budget.id)
+
+def month_budget_query(user_id, month):
+    """A user's active budget for the month starting on month"""
+    return Budget.query.filter_by(user_id=user_id, month=month, archived=False)
+
+def active_budget_items_query(budget_id):
+    return BudgetItem.query.filter_by(budget_id=budget_id, archived=False)
+
+def budget_item_query(budget_id, category_id):
+    """The active item of a budget for one category"""
+    return active_budget_items_query(budget_id).filter_by(category_id=category_id)
+
+def recent_transactions_query(user_id, limit=5):
+    return Transaction.query.filter_by(user_id=user_id)\
+        .options(db.joinedload(Transaction.category))\
+        .order_by(Transaction.date.desc())\
+        .limit(limit)
+
+def get_dashboard_snapshot(user, rates=None):
+    """
+    Collect everything the dashboard shows in five queries
+    Totals are converted into the user's default currency with rates (default: today's rates).
+    Returns a dict of template variables for index.html holding plain values only, so it can be cached
+    """
+    rates = fx_rates() if rates is None else rates
+
+    # Current month's budget and what has been spent against it
+    current_budget = None
+    budget_remaining = 0
+    budget_row = current_budget_query(user.id).first()
+    if budget_row:
+        budget, total_spent = budget_row
+        current_budget = {
+            'total_amount': budget.total_amount,
+            'currency': budget.currency,
+            'total_spent': total_spent
+        }
+        budget_remaining = budget.total_amount - total_spent
+
+    # Latest balance per source with its currency
+    balances = latest_balances(user.id)
+    snapshot = {}
+    for source in SAVING_SOURCES:
+        balance = balances.get(source)
+        snapshot[f'{source}_balance'] = balance.amount if balance else 0
+        snapshot[f'{source}_currency'] = balance.currency if balance else user.default_currency
+
+    # Consolidated totals across every currency the user holds
+    consolidated = consolidated_balance_query(user.id, user.default_currency, rates).one()
+    investments = investment_totals_query(user.id, user.default_currency, rates).one()
+
+    snapshot.update(
+        current_budget=current_budget,
+        budget_remaining=budget_remaining,
+        total_income=consolidated.total,
+        income_currency=user.default_currency,
+        income_unconverted=consolidated.unconverted,
+        total_market_value=investments.total_market_value,
+        total_initial_investment=investments.total_initial_investment,
+        investment_currency=user.default_currency,
+        investments_unconverted=investments.unconverted,
+        recent_transactions=[{
+            'date': t.date,
+            'description': t.description,
+            'category': {'name': t.category.name} if t.category else None,
+            'type': t.type,
+            'source': t.source,
+            'amount': t.amount,
+            'currency': t.currency
+        } for t in recent_transactions_query(user.id)]
+    )
+    return snapshot
+
+def get_cached_dashboard_snapshot(user):
+    """Dashboard snapshot from the per-user cache, rebuilt when the user's data version or the FX rates have moved on"""
+    rates = fx_rates()
+    version = (user_data_version(user), tuple(sorted(rates.items())))
+    snapshot = dashboard_cache.get(user.id, version=version)
+    if snapshot is None:
+        snapshot = get_dashboard_snapshot(user, rates)
+        dashboard_cache.set(user.id, snapshot, version=version)
+    return snapshot
+
 # Main routes
 @app.route('/')
 @login_required
 @check_timeout
 def index():
-    # Get current month's budget
-    current_month = date.today().replace(day=1)
-    current_budget = Budget.query.filter_by(
-        user_id=current_user.id,
-        month=current_month,
-        archived=False
-    ).first()
-    
-    # Initialize budget variables
-    total_spent = 0
-    budget_remaining = 0
-    
-    if current_budget:
-        # Calculate total spent for current budget
-        budget_items = BudgetItem.query.filter_by(budget_id=current_budget.id, archived=False).all()
-        total_spent = sum(item.spent_amount for item in budget_items)
-        current_budget.total_spent = total_spent
-        budget_remaining = current_budget.total_amount - total_spent
-
-    # Get latest savings balances with their currencies
-    latest_savings = {
-        'bank': Saving.query.filter_by(user_id=current_user.id, type='bank')
-                          .order_by(Saving.date.desc()).first(),
-        'mobile_money': Saving.query.filter_by(user_id=current_user.id, type='mobile_money')
-                                 .order_by(Saving.date.desc()).first(),
-        'cash': Saving.query.filter_by(user_id=current_user.id, type='cash')
-                         .order_by(Saving.date.desc()).first()
-    }
-    
-    # Calculate balances with their respective currencies
-    bank_balance = latest_savings['bank'].amount if latest_savings['bank'] else 0
-    bank_currency = latest_savings['bank'].currency if latest_savings['bank'] else current_user.default_currency
-    
-    mobile_money_balance = latest_savings['mobile_money'].amount if latest_savings['mobile_money'] else 0
-    mobile_money_currency = latest_savings['mobile_money'].currency if latest_savings['mobile_money'] else current_user.default_currency
-    
-    cash_balance = latest_savings['cash'].amount if latest_savings['cash'] else 0
-    cash_currency = latest_savings['cash'].currency if latest_savings['cash'] else current_user.default_currency
-    
-    # Get the most recent savings entry for currency
-    most_recent_saving = Saving.query.filter_by(user_id=current_user.id)\
-        .order_by(Saving.date.desc())\
-        .first()
-    
-    total_income = bank_balance + mobile_money_balance + cash_balance
-    income_currency = most_recent_saving.currency if most_recent_saving else current_user.default_currency
-    
-    # Get investment totals with currency
-    investments = Investment.query.filter_by(user_id=current_user.id).all()
-    total_market_value = sum(inv.current_value for inv in investments)
-    total_initial_investment = sum(inv.initial_value for inv in investments)
-    investment_currency = investments[0].currency if investments else current_user.default_currency
-    
-    # Get recent transactions
-    recent_transactions = Transaction.query.filter_by(user_id=current_user.id)\
-        .order_by(Transaction.date.desc())\
-        .limit(5)\
-        .all()
-    
-    return render_template('index.html',
-                         current_budget=current_budget,
-                         bank_balance=bank_balance,
-                         bank_currency=bank_currency,
-                         mobile_money_balance=mobile_money_balance,
-                         mobile_money_currency=mobile_money_currency,
-                         cash_balance=cash_balance,
-                         cash_currency=cash_currency,
-                         total_income=total_income,
-                         income_currency=income_currency,
-                         total_market_value=total_market_value,
-                         total_initial_investment=total_initial_investment,
-                         investment_currency=investment_currency,
-                         recent_transactions=recent_transactions,
-                         budget_remaining=budget_remaining)
+    return render_template('index.html', **get_cached_dashboard_snapshot(current_user))
 
 @app.route('/dashboard')
 @login_required
 @check_timeout
 def dashboard():
-    # Get current month's budget and remaining balance
-    current_month = date.today().replace(day=1)
-    budget = Budget.query.filter_by(
-        user_id=current_user.id,
-        month=current_month,
-        archived=False
-    ).first()
-    
-    budget_remaining = 0
-    total_budget = 0
-    if budget:
-        budget_items = BudgetItem.query.filter_by(
-            budget_id=budget.id,
-            archived=False
-        ).all()
-        
-        total_spent = sum(item.spent_amount for item in budget_items)
-        total_budget = budget.total_amount
-        budget_remaining = total_budget - total_spent
+    return render_template('index.html', **get_cached_dashboard_snapshot(current_user))
 
-    # Get recent transactions
-    recent_transactions = Transaction.query.filter_by(
-        user_id=current_user.id
-    ).order_by(Transaction.date.desc()).limit(5).all()
+def encode_cursor(transaction):
+    """Encode the (date, id) position of a transaction as an opaque cursor"""
+    position = f"{transaction.date.strftime('%Y-%m-%dT%H:%M:%S.%f')}|{transaction.id}"
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
 
-    # Get financial sources total
-    financial_sources = FinancialSource.query.filter_by(user_id=current_user.id).all()
-    total_balance = sum(source.balance for source in financial_sources)
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor
+    Returns a (date, id) tuple, or None if the cursor is missing; raises ValueError if it is malformed
+    """
+    if not cursor:
+        return None
+    try:
+        position = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date_part, id_part = position.split('|')
+        return datetime.strptime(date_part, '%Y-%m-%dT%H:%M:%S.%f'), int(id_part)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+
+def transactions_page_query(user_id, currency, position=None):
+    """Non-archived transactions newest first, starting after the given (date, id) position"""
+    query = Transaction.query.filter_by(
+        user_id=user_id,
+        currency=currency,
+        archived=False
+    )
+    if position:
+        query = query.filter(tuple_(Transaction.date, Transaction.id) < position)
+    return query.options(db.joinedload(Transaction.category))\
+        .order_by(Transaction.date.desc(), Transaction.id.desc())
 
-    return render_template('dashboard.html',
-                         recent_transactions=recent_transactions,
-                         total_balance=total_balance,
-                         budget_remaining=budget_remaining,
-                         total_budget=total_budget,
-                         budget=budget)
+def get_transactions_page(user_id, currency, cursor=None, limit=TRANSACTIONS_PER_PAGE):
+    """
+    Fetch one page of transactions using keyset pagination on (date, id)
+    Returns (transactions, next_cursor) tuple; next_cursor is None on the last page
+    """
+    rows = transactions_page_query(user_id, currency, decode_cursor(cursor)).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
 
 @app.route('/transactions', methods=['GET'])
 @login_required
@@ -448,32 +1358,206 @@ def dashboard():
 def transactions():
     # GET request - show transactions list
     selected_currency = request.args.get('currency', current_user.default_currency)
-    transactions = Transaction.query.filter_by(
-        user_id=current_user.id,
-        currency=selected_currency,
-        archived=False
-    ).order_by(Transaction.date.desc()).all()
+    try:
+        transactions, next_cursor = get_transactions_page(
+            current_user.id,
+            selected_currency,
+            cursor=request.args.get('cursor')
+        )
+    except ValueError:
+        abort(400)
     
     # Get categories for the form
-    expense_categories = Category.query.filter_by(user_id=current_user.id, type='expense').order_by(Category.name).all()
-    income_categories = Category.query.filter_by(user_id=current_user.id, type='income').order_by(Category.name).all()
+    expense_categories = user_categories_query(current_user.id, 'expense').all()
+    income_categories = user_categories_query(current_user.id, 'income').all()
     
     return render_template('transactions.html', 
                          transactions=transactions,
+                         next_cursor=next_cursor,
                          expense_categories=expense_categories,
                          income_categories=income_categories,
                          selected_currency=selected_currency,
                          currencies=SUPPORTED_CURRENCIES,
                          today=date.today())
 
+@app.route('/api/transactions')
+@login_required
+@check_timeout
+def api_transactions():
+    selected_currency = request.args.get('currency', current_user.default_currency)
+    limit = request.args.get('limit', TRANSACTIONS_PER_PAGE, type=int)
+    limit = max(1, min(limit, MAX_TRANSACTIONS_PER_PAGE))
+    
+    try:
+        transactions, next_cursor = get_transactions_page(
+            current_user.id,
+            selected_currency,
+            cursor=request.args.get('cursor'),
+            limit=limit
+        )
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+    
+    return jsonify({
+        'transactions': [{
+            'id': t.id,
+            'date': t.date.strftime('%Y-%m-%d'),
+            'description': t.description,
+            'category': t.category.name if t.category else None,
+            'type': t.type,
+            'source': t.source,
+            'amount': float(t.amount),
+            'currency': t.currency
+        } for t in transactions],
+        'next_cursor': next_cursor
+    })
+
+# Conditional requests
+def versioned_etag(get_version):
+    """
+    Tag a JSON view's response with an ETag derived from get_version(current_user) and the request arguments
+    A request whose If-None-Match still matches gets 304 Not Modified without running the view.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = (f'{request.endpoint}|{current_user.id}|{get_version(current_user)}|'
+                   f'{sorted(request.view_args.items())}|{sorted(request.args.items(multi=True))}')
+            etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+def analytics_version(user):
+    """The user's data version and the current month, which is the last month of every analytics window"""
+    return f'{user_data_version(user)}|{date.today():%Y-%m}'
+
+analytics_etag = versioned_etag(analytics_version)
+category_version_etag = versioned_etag(current_category_version)
+
+# Analytics
+
+def analytics_months():
+    """First day of each month the analytics request covers, oldest first"""
+    count = request.args.get('months', ANALYTICS_MONTHS, type=int)
+    count = max(1, min(count, MAX_ANALYTICS_MONTHS))
+    months = [date.today().replace(day=1)]
+    while len(months) < count:
+        months.append((months[-1] - timedelta(days=1)).replace(day=1))
+    return months[::-1]
+
+def monthly_totals_query(user_id, currency, start):
+    """Income and expense totals per month since start"""
+    month = db.func.strftime('%Y-%m', Transaction.date).label('month')
+    return db.session.query(month, Transaction.type, db.func.sum(Transaction.amount).label('total'))\
+        .filter(
+            Transaction.user_id == user_id,
+            Transaction.currency == currency,
+            Transaction.archived == False,
+            Transaction.date >= start
+        ).group_by(month, Transaction.type)
+
+def category_spend_query(user_id, currency, start):
+    """Expense totals per month and category since start"""
+    month = db.func.strftime('%Y-%m', Transaction.date).label('month')
+    return db.session.query(month, Category.name, db.func.sum(Transaction.amount).label('total'))\
+        .select_from(Transaction)\
+        .outerjoin(Category, Category.id == Transaction.category_id)\
+        .filter(
+            Transaction.user_id == user_id,
+            Transaction.currency == currency,
+            Transaction.archived == False,
+            Transaction.type == 'expense',
+            Transaction.date >= start
+        ).group_by(month, Category.id, Category.name)
+
+def budget_utilisation_query(user_id, start):
+    """Each budget since start, archived ones included, with its planned and spent totals across active items"""
+    def budgets(budget_model, item_model):
+        return db.session.query(
+            db.func.strftime('%Y-%m', budget_model.month).label('month'),
+            budget_model.currency,
+            budget_model.total_amount,
+            db.func.coalesce(db.func.sum(item_model.planned_amount), 0).label('planned'),
+            db.func.coalesce(db.func.sum(item_model.spent_amount), 0).label('spent')
+        ).outerjoin(item_model, db.and_(item_model.budget_id == budget_model.id, item_model.archived == False))\
+            .filter(budget_model.user_id == user_id, budget_model.month >= start)\
+            .group_by(budget_model.id)
+
+    return budgets(Budget, BudgetItem).union_all(budgets(ArchivedBudget, ArchivedBudgetItem))\
+        .order_by(db.literal_column('month'))
+
+@app.route('/api/analytics/income-expense')
+@login_required
+@check_timeout
+@analytics_etag
+def analytics_income_expense():
+    currency = request.args.get('currency', current_user.default_currency)
+    first_days = analytics_months()
+    months = [f'{month:%Y-%m}' for month in first_days]
+    totals = {(row.month, row.type): row.total
+              for row in monthly_totals_query(current_user.id, currency, first_days[0])}
+
+    return jsonify({
+        'currency': currency,
+        'months': months,
+        'income': [float(totals.get((month, 'income'), 0)) for month in months],
+        'expense': [float(totals.get((month, 'expense'), 0)) for month in months]
+    })
+
+@app.route('/api/analytics/category-spend')
+@login_required
+@check_timeout
+@analytics_etag
+def analytics_category_spend():
+    currency = request.args.get('currency', current_user.default_currency)
+    first_days = analytics_months()
+    months = [f'{month:%Y-%m}' for month in first_days]
+    positions = {month: i for i, month in enumerate(months)}
+
+    categories = {}
+    for row in category_spend_query(current_user.id, currency, first_days[0]):
+        totals = categories.setdefault(row.name or 'Uncategorized', [0.0] * len(months))
+        totals[positions[row.month]] += float(row.total)
+
+    return jsonify({
+        'currency': currency,
+        'months': months,
+        'categories': [
+            {'name': name, 'totals': totals}
+            for name, totals in sorted(categories.items(), key=lambda item: -sum(item[1]))
+        ]
+    })
+
+@app.route('/api/analytics/budget-utilisation')
+@login_required
+@check_timeout
+@analytics_etag
+def analytics_budget_utilisation():
+    budgets = []
+    for row in budget_utilisation_query(current_user.id, analytics_months()[0]):
+        budgets.append({
+            'month': row.month,
+            'currency': row.currency,
+            'total_amount': float(row.total_amount),
+            'planned': float(row.planned),
+            'spent': float(row.spent),
+            'utilisation': round(float(row.spent / row.total_amount * 100), 1) if row.total_amount else 0.0
+        })
+    return jsonify({'budgets': budgets})
+
 @app.route('/api/categories/<type>')
 @login_required
 @check_timeout
+@category_version_etag
 def get_categories(type):
-    categories = Category.query.filter_by(
-        user_id=current_user.id,
-        type=type
-    ).order_by(Category.name).all()
+    categories = user_categories_query(current_user.id, type).all()
     return jsonify([{'id': c.id, 'name': c.name} for c in categories])
 
 @app.route('/transaction/delete/<int:id>', methods=['POST'])
@@ -485,42 +1569,38 @@ def delete_transaction(id):
         return jsonify({'success': False, 'message': 'Unauthorized access'})
     
     try:
+        # Claim the row first so a concurrent delete of the same transaction cannot revert it twice
+        deleted = db.session.execute(
+            db.delete(Transaction).where(Transaction.id == transaction.id),
+            execution_options={'synchronize_session': False}
+        )
+        if deleted.rowcount != 1:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'Transaction was already deleted'})
+        db.session.expunge(transaction)
+        
         # Revert budget changes if expense
         if transaction.type == 'expense':
-            current_month = transaction.date.replace(day=1)
-            budget = Budget.query.filter_by(
-                user_id=current_user.id,
-                month=current_month,
-                archived=False
-            ).first()
+            current_month = transaction.date.date().replace(day=1)
+            budget = month_budget_query(current_user.id, current_month).first()
             
             if budget:
-                budget_item = BudgetItem.query.filter_by(
-                    budget_id=budget.id,
-                    category_id=transaction.category_id,
-                    archived=False
-                ).first()
+                budget_item = budget_item_query(budget.id, transaction.category_id).first()
                 
                 if budget_item:
-                    budget_item.spent_amount -= transaction.amount
+                    add_spent_amount(budget_item, -transaction.amount)
         
         # Revert finance changes
-        saving = Saving.query.filter_by(
-            user_id=current_user.id,
-            type=transaction.source
-        ).order_by(Saving.date.desc()).first()
-        
-        if saving:
-            new_saving = Saving(
-                type=transaction.source,
-                amount=saving.amount - transaction.amount if transaction.type == 'income' else saving.amount + transaction.amount,
-                currency=transaction.currency,
-                description=f"Reverted transaction: {transaction.description}",
-                user_id=current_user.id
+        if db.session.get(AccountBalance, (current_user.id, transaction.source, transaction.currency)):
+            adjust_balance(
+                current_user.id,
+                transaction.source,
+                transaction.currency,
+                -transaction.amount if transaction.type == 'income' else transaction.amount,
+                f"Reverted transaction: {transaction.description}"
             )
-            db.session.add(new_saving)
         
-        db.session.delete(transaction)
+        mark_user_data_changed(current_user.id)
         db.session.commit()
         return jsonify({'success': True, 'message': 'Transaction deleted successfully'})
     except Exception as e:
@@ -535,23 +1615,13 @@ def budget():
     # Get current month's budget
     current_month = date.today().replace(day=1)
     
-    expense_categories = Category.query.filter_by(
-        user_id=current_user.id,
-        type='expense'
-    ).order_by(Category.name).all()
+    expense_categories = user_categories_query(current_user.id, 'expense').all()
     
-    budget = Budget.query.filter_by(
-        user_id=current_user.id,
-        month=current_month,
-        archived=False
-    ).first()
+    budget = month_budget_query(current_user.id, current_month).first()
 
     if budget:
         # Get budget items
-        budget_items = BudgetItem.query.filter_by(
-            budget_id=budget.id,
-            archived=False
-        ).all()
+        budget_items = active_budget_items_query(budget.id).all()
 
         # Calculate totals
         total_spent = sum(item.spent_amount for item in budget_items)
@@ -578,7 +1648,8 @@ def budget():
                          total_spent=total_spent,
                          total_planned=total_planned,
                          total_remaining=total_remaining,
-                         available_for_budget=available_for_budget)
+                         available_for_budget=available_for_budget,
+                         category_version=current_category_version(current_user))
 
 @app.route('/budget/create', methods=['POST'])
 @login_required
@@ -597,18 +1668,14 @@ def create_budget():
             flash('Please provide both total amount and currency', 'error')
             return redirect(url_for('budget'))
             
-        total_amount = float(total_amount)
+        total_amount = parse_money(total_amount)
         if total_amount <= 0:
             flash('Budget amount must be greater than 0', 'error')
             return redirect(url_for('budget'))
         
         # Check if a budget already exists for this month
         current_month = date.today().replace(day=1)
-        existing_budget = Budget.query.filter_by(
-            user_id=current_user.id,
-            month=current_month,
-            archived=False
-        ).first()
+        existing_budget = month_budget_query(current_user.id, current_month).first()
         
         if existing_budget:
             flash('A budget already exists for this month', 'error')
@@ -622,6 +1689,7 @@ def create_budget():
             user_id=current_user.id
         )
         db.session.add(new_budget)
+        mark_user_data_changed(current_user.id)
         db.session.commit()
         
         flash('Budget created successfully!', 'success')
@@ -646,12 +1714,10 @@ def edit_budget_item():
     if item.budget.user_id != current_user.id:
         return jsonify({'status': 'error', 'message': 'Unauthorized access'}), 403
     
-    new_amount = float(request.form['planned_amount'])
+    new_amount = parse_money(request.form['planned_amount'])
     
     # Calculate current total of all budget items excluding this item
-    current_items_total = db.session.query(db.func.sum(BudgetItem.planned_amount))\
-        .filter_by(budget_id=item.budget_id, archived=False)\
-        .filter(BudgetItem.id != item_id).scalar() or 0
+    current_items_total = other_items_planned_query(item.budget_id, item.id).scalar() or 0
     
     # Check if editing this item would exceed the budget
     if current_items_total + new_amount > item.budget.total_amount:
@@ -662,8 +1728,14 @@ def edit_budget_item():
         }), 400
     
     # Update the item
+    category_changed = str(item.category_id) != request.form['category_id']
     item.planned_amount = new_amount
     item.category_id = request.form['category_id']
+    mark_user_data_changed(current_user.id)
+    if category_changed:
+        # The spent amount belonged to the old category; recount it from the new one's transactions
+        db.session.flush()
+        reconcile_spent_amounts(item.budget.month, [current_user.id])
     db.session.commit()
     
     return jsonify({'status': 'success', 'message': 'Budget item updated successfully'})
@@ -675,7 +1747,7 @@ def add_budget_item():
     try:
         budget_id = request.form.get('budget_id')
         category_id = request.form.get('category_id')
-        planned_amount = float(request.form.get('planned_amount', 0))
+        planned_amount = parse_money(request.form.get('planned_amount', 0))
         description = request.form.get('description', '').strip()
 
         # Validate inputs
@@ -707,6 +1779,7 @@ def add_budget_item():
         )
 
         db.session.add(new_item)
+        mark_user_data_changed(current_user.id)
         db.session.commit()
 
         flash('Budget item added successfully!', 'success')
@@ -722,7 +1795,7 @@ def add_budget_item():
 @check_timeout
 def increase_budget():
     budget_id = request.form.get('budget_id')
-    amount = float(request.form.get('amount', 0))
+    amount = parse_money(request.form.get('amount', 0))
     
     if not budget_id or amount <= 0:
         flash('Invalid budget increase request', 'error')
@@ -734,6 +1807,7 @@ def increase_budget():
         return redirect(url_for('budget'))
     
     budget.total_amount += amount
+    mark_user_data_changed(current_user.id)
     db.session.commit()
     
     flash(f'Budget increased by {budget.currency} {amount:.2f}', 'success')
@@ -744,7 +1818,7 @@ def increase_budget():
 @check_timeout
 def reset_budget():
     budget_id = request.form['budget_id']
-    new_amount = float(request.form['new_amount'])
+    new_amount = parse_money(request.form['new_amount'])
     budget = Budget.query.get_or_404(budget_id)
     
     if budget.user_id != current_user.id:
@@ -764,10 +1838,67 @@ def reset_budget():
     
     # Update the budget
     budget.total_amount = new_amount
+    mark_user_data_changed(current_user.id)
     db.session.commit()
     
     return jsonify({'status': 'success', 'message': 'Budget has been reset successfully'})
 
+# Archiving
+def archivable_ids_query(model, limit):
+    """Ids of the first limit rows of a hot table flagged as archived"""
+    return db.select(model.id).where(model.archived == True).order_by(model.id).limit(limit)
+
+def archive_rows(budget_ids=None, batch_size=ARCHIVE_BATCH_ROWS):
+    """
+    Move one batch of archived budgets (with all their items) and archived transactions to the archive tables
+    budget_ids limits the move to those budgets and skips transactions. The caller commits.
+    Returns (budgets, budget items, transactions) moved.
+    """
+    if budget_ids is None:
+        budget_ids = db.session.scalars(archivable_ids_query(Budget, batch_size)).all()
+        transaction_ids = db.session.scalars(archivable_ids_query(Transaction, batch_size)).all()
+    else:
+        transaction_ids = []
+
+    item_count = 0
+    if budget_ids:
+        budget_columns = ['id', 'month', 'total_amount', 'currency', 'user_id', 'created_at', 'updated_at']
+        db.session.execute(db.insert(ArchivedBudget).from_select(
+            budget_columns,
+            db.select(*[getattr(Budget, c) for c in budget_columns]).where(Budget.id.in_(budget_ids))
+        ))
+        item_columns = ['id', 'budget_id', 'category_id', 'planned_amount', 'spent_amount', 'description']
+        db.session.execute(db.insert(ArchivedBudgetItem).from_select(
+            item_columns + ['archived'],
+            db.select(*[getattr(BudgetItem, c) for c in item_columns], db.func.coalesce(BudgetItem.archived, False))
+                .where(BudgetItem.budget_id.in_(budget_ids))
+        ))
+        item_count = db.session.execute(
+            db.delete(BudgetItem).where(BudgetItem.budget_id.in_(budget_ids)),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        db.session.execute(
+            db.delete(Budget).where(Budget.id.in_(budget_ids)),
+            execution_options={'synchronize_session': False}
+        )
+
+    if transaction_ids:
+        columns = ['id', 'date', 'type', 'amount', 'description', 'category_id', 'user_id', 'currency', 'source']
+        db.session.execute(db.insert(ArchivedTransaction).from_select(
+            columns,
+            db.select(*[getattr(Transaction, c) for c in columns]).where(Transaction.id.in_(transaction_ids))
+        ))
+        db.session.execute(
+            db.delete(Transaction).where(Transaction.id.in_(transaction_ids)),
+            execution_options={'synchronize_session': False}
+        )
+
+    return len(budget_ids), item_count, len(transaction_ids)
+
+def get_user_budget_or_404(budget_id):
+    """A budget from the hot table, or from the archive once it has been moved"""
+    return db.session.get(Budget, budget_id) or ArchivedBudget.query.get_or_404(budget_id)
+
 @app.route('/budget/archive/<int:budget_id>')
 @login_required
 @check_timeout
@@ -783,19 +1914,37 @@ def archive_budget(budget_id):
         return redirect(url_for('budget'))
     
     budget.archived = True
+    db.session.flush()
+    archive_rows(budget_ids=[budget.id])
+    mark_user_data_changed(current_user.id)
     db.session.commit()
     flash('Budget archived successfully!', 'success')
     return redirect(url_for('budget'))
 
+def other_items_planned_query(budget_id, item_id):
+    """Planned total of a budget's active items other than item_id"""
+    return db.session.query(db.func.sum(BudgetItem.planned_amount))\
+        .filter_by(budget_id=budget_id, archived=False).filter(BudgetItem.id != item_id)
+
+def archived_budget_queries(user_id):
+    """
+    A user's archived budgets: those already moved to the archive table plus any flagged budgets
+    archive_rows() has not reached yet
+    """
+    return [
+        Budget.query.filter_by(user_id=user_id, archived=True),
+        ArchivedBudget.query.filter_by(user_id=user_id).options(
+            db.selectinload(ArchivedBudget.items).joinedload(ArchivedBudgetItem.category)
+        ),
+    ]
+
 @app.route('/budgets/archived')
 @login_required
 @check_timeout
 def view_archived_budgets():
     # Get all archived budgets for the current user, ordered by month
-    archived_budgets = Budget.query.filter_by(
-        user_id=current_user.id,
-        archived=True
-    ).order_by(Budget.month.desc()).all()
+    archived_budgets = [budget for query in archived_budget_queries(current_user.id) for budget in query]
+    archived_budgets.sort(key=lambda budget: budget.month, reverse=True)
     
     return render_template('archived_budgets.html', 
                          archived_budgets=archived_budgets)
@@ -813,6 +1962,9 @@ def archive_budget_post(budget_id):
         return jsonify({'status': 'error', 'message': "Can't archive empty budget"}), 400
     
     budget.archived = True
+    db.session.flush()
+    archive_rows(budget_ids=[budget.id])
+    mark_user_data_changed(current_user.id)
     db.session.commit()
     return jsonify({'status': 'success', 'message': 'Budget archived successfully'})
 
@@ -821,17 +1973,19 @@ def archive_budget_post(budget_id):
 @check_timeout
 def delete_budget(budget_id):
     try:
-        budget = Budget.query.get_or_404(budget_id)
+        budget = get_user_budget_or_404(budget_id)
         
         # Security check: ensure user owns this budget
         if budget.user_id != current_user.id:
             return jsonify({'success': False, 'message': 'Unauthorized access'}), 403
         
         # Delete associated budget items first
-        BudgetItem.query.filter_by(budget_id=budget.id).delete()
+        item_model = ArchivedBudgetItem if isinstance(budget, ArchivedBudget) else BudgetItem
+        item_model.query.filter_by(budget_id=budget.id).delete()
         
         # Delete the budget
         db.session.delete(budget)
+        mark_user_data_changed(current_user.id)
         db.session.commit()
         
         return jsonify({'success': True, 'message': 'Budget deleted successfully'})
@@ -851,6 +2005,7 @@ def delete_budget_item(item_id):
             return jsonify({'status': 'error', 'message': 'Unauthorized access'}), 403
         
         db.session.delete(budget_item)
+        mark_user_data_changed(current_user.id)
         db.session.commit()
         
         return jsonify({
@@ -882,16 +2037,22 @@ def update_budget_item(item_id):
             return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
         
         try:
-            planned_amount = float(data['planned_amount'])
+            planned_amount = parse_money(data['planned_amount'])
             if planned_amount < 0:
                 return jsonify({'status': 'error', 'message': 'Planned amount cannot be negative'}), 400
         except ValueError:
             return jsonify({'status': 'error', 'message': 'Invalid planned amount'}), 400
         
         # Update budget item
+        category_changed = str(budget_item.category_id) != str(data['category_id'])
         budget_item.category_id = data['category_id']
         budget_item.planned_amount = planned_amount
         
+        mark_user_data_changed(current_user.id)
+        if category_changed:
+            # The spent amount belonged to the old category; recount it from the new one's transactions
+            db.session.flush()
+            reconcile_spent_amounts(budget_item.budget.month, [current_user.id])
         db.session.commit()
         
         return jsonify({
@@ -911,7 +2072,7 @@ def update_budget_item(item_id):
 def use_budget_template(budget_id):
     try:
         # Get the template budget
-        template_budget = Budget.query.get_or_404(budget_id)
+        template_budget = get_user_budget_or_404(budget_id)
         
         # Security check: ensure user owns this budget
         if template_budget.user_id != current_user.id:
@@ -921,11 +2082,7 @@ def use_budget_template(budget_id):
         current_month = date.today().replace(day=1)
         
         # Check if budget already exists for current month
-        existing_budget = Budget.query.filter_by(
-            user_id=current_user.id,
-            month=current_month,
-            archived=False
-        ).first()
+        existing_budget = month_budget_query(current_user.id, current_month).first()
         
         if existing_budget:
             return jsonify({
@@ -954,6 +2111,7 @@ def use_budget_template(budget_id):
             )
             db.session.add(new_item)
             
+        mark_user_data_changed(current_user.id)
         db.session.commit()
         return jsonify({
             'success': True,
@@ -969,15 +2127,11 @@ def use_budget_template(budget_id):
 @app.route('/finance')
 @login_required
 def finance():
-    # Get savings by type
-    savings = {
-        'bank': Saving.query.filter_by(user_id=current_user.id, type='bank').order_by(Saving.date.desc()).first(),
-        'mobile_money': Saving.query.filter_by(user_id=current_user.id, type='mobile_money').order_by(Saving.date.desc()).first(),
-        'cash': Saving.query.filter_by(user_id=current_user.id, type='cash').order_by(Saving.date.desc()).first()
-    }
+    # Get current balance by source
+    savings = latest_balances(current_user.id)
     
     # Get investments
-    investments = Investment.query.filter_by(user_id=current_user.id).all()
+    investments = investments_query(current_user.id).all()
     
     return render_template('finance/index.html', 
                          savings=savings,
@@ -988,18 +2142,12 @@ def finance():
 @login_required
 def update_savings():
     saving_type = request.form['type']
-    amount = float(request.form['amount'])
+    amount = parse_money(request.form['amount'])
     currency = request.form['currency']
     description = request.form['description']
     
-    saving = Saving(
-        type=saving_type,
-        amount=amount,
-        currency=currency,
-        description=description,
-        user_id=current_user.id
-    )
-    db.session.add(saving)
+    set_balance(current_user.id, saving_type, currency, amount, description)
+    mark_user_data_changed(current_user.id)
     db.session.commit()
     
     flash('Savings updated successfully!', 'success')
@@ -1010,13 +2158,14 @@ def update_savings():
 def add_investment():
     investment = Investment(
         type=request.form['type'],
-        initial_value=float(request.form['initial_value']),
-        current_value=float(request.form['current_value']),
+        initial_value=parse_money(request.form['initial_value']),
+        current_value=parse_money(request.form['current_value']),
         currency=request.form['currency'],
         description=request.form['description'],
         user_id=current_user.id
     )
     db.session.add(investment)
+    mark_user_data_changed(current_user.id)
     db.session.commit()
     
     flash('Investment added successfully!', 'success')
@@ -1030,8 +2179,9 @@ def update_investment(investment_id):
         flash('Unauthorized access', 'error')
         return redirect(url_for('finance'))
     
-    investment.current_value = float(request.form['current_value'])
+    investment.current_value = parse_money(request.form['current_value'])
     investment.last_updated = datetime.utcnow()
+    mark_user_data_changed(current_user.id)
     db.session.commit()
     
     flash('Investment updated successfully!', 'success')
@@ -1061,10 +2211,11 @@ def edit_investment(investment_id):
         # Update investment
         investment.name = name
         investment.type = investment_type
-        investment.initial_value = float(initial_value)
-        investment.current_value = float(current_value)
+        investment.initial_value = parse_money(initial_value)
+        investment.current_value = parse_money(current_value)
         investment.notes = notes
 
+        mark_user_data_changed(current_user.id)
         db.session.commit()
 
         return jsonify({
@@ -1074,8 +2225,8 @@ def edit_investment(investment_id):
                 'id': investment.id,
                 'name': investment.name,
                 'type': investment.type,
-                'initial_value': investment.initial_value,
-                'current_value': investment.current_value,
+                'initial_value': float(investment.initial_value),
+                'current_value': float(investment.current_value),
                 'notes': investment.notes,
                 'currency': investment.currency
             }
@@ -1103,6 +2254,7 @@ def delete_investment(investment_id):
             }), 403
 
         db.session.delete(investment)
+        mark_user_data_changed(current_user.id)
         db.session.commit()
 
         return jsonify({
@@ -1122,7 +2274,7 @@ def delete_investment(investment_id):
 def create_transaction():
     if request.method == 'POST':
         try:
-            amount = float(request.form['amount'])
+            amount = parse_money(request.form['amount'])
             description = request.form['description']
             transaction_type = request.form['type']
             category_id = request.form.get('category_id')
@@ -1132,13 +2284,13 @@ def create_transaction():
                 flash('Please fill in all required fields', 'error')
                 return redirect(url_for('transactions'))
 
+            budget = None
+            budget_item = None
+
             # For expense transactions, validate source balance and budget
             if transaction_type == 'expense':
                 # 1. Check if source has sufficient balance
-                source_account = Saving.query.filter_by(
-                    user_id=current_user.id,
-                    type=source
-                ).first()
+                source_account = db.session.get(AccountBalance, (current_user.id, source, current_user.default_currency))
                 
                 if not source_account:
                     flash(f'Error: {source} account not found. Please set up your accounts in the Finance section.', 'error')
@@ -1151,21 +2303,13 @@ def create_transaction():
                 # 2. Check if the expense is budgeted for
                 if category_id:
                     current_month = date.today().replace(day=1)
-                    budget = Budget.query.filter_by(
-                        user_id=current_user.id,
-                        month=current_month,
-                        archived=False
-                    ).first()
+                    budget = month_budget_query(current_user.id, current_month).first()
 
                     if not budget:
                         flash('Please create a budget first before making expense transactions.', 'error')
                         return redirect(url_for('budget'))
 
-                    budget_item = BudgetItem.query.filter_by(
-                        budget_id=budget.id,
-                        category_id=category_id,
-                        archived=False
-                    ).first()
+                    budget_item = budget_item_query(budget.id, category_id).first()
 
                     if not budget_item:
                         flash('This expense category is not budgeted for. Please add it to your budget first.', 'error')
@@ -1184,68 +2328,35 @@ def create_transaction():
             )
             db.session.add(transaction)
 
-            # If it's an expense, update the budget
-            if transaction_type == 'expense' and category_id:
-                # Get current month's budget (we already validated its existence)
-                current_month = date.today().replace(day=1)
-                budget = Budget.query.filter_by(
-                    user_id=current_user.id,
-                    month=current_month,
-                    archived=False
-                ).first()
-                
-                # Get budget item (we already validated its existence)
-                budget_item = BudgetItem.query.filter_by(
-                    budget_id=budget.id,
-                    category_id=category_id,
-                    archived=False
-                ).first()
-
-                # Update spent amount
-                budget_item.spent_amount = float(budget_item.spent_amount or 0) + amount
-                db.session.add(budget_item)
+            # Update savings/finance based on transaction type
+            # Income adds to the specified source; expenses subtract from it and must not overdraw it
+            adjust_balance(
+                current_user.id,
+                source,
+                current_user.default_currency,
+                amount if transaction_type == 'income' else -amount,
+                f'Updated from transaction: {description}',
+                allow_negative=transaction_type == 'income'
+            )
+
+            # If it's an expense, update the budget item we validated above
+            if budget_item:
+                spent_amount = add_spent_amount(budget_item, amount)
+                remaining = budget_item.planned_amount - spent_amount
                 
                 # Check if over budget and flash appropriate message
-                if budget_item.spent_amount > budget_item.planned_amount:
-                    remaining = budget_item.planned_amount - budget_item.spent_amount
+                if spent_amount > budget_item.planned_amount:
                     flash(f'Warning: You have exceeded the budget for {budget_item.category.name} by {budget.currency} {abs(remaining):.2f}', 'warning')
                 else:
-                    remaining = budget_item.planned_amount - budget_item.spent_amount
                     flash(f'Budget remaining for {budget_item.category.name}: {budget.currency} {remaining:.2f}', 'info')
 
-            # Update savings/finance based on transaction type
-            if transaction_type == 'income':
-                # For income, add to the specified source
-                saving = Saving.query.filter_by(
-                    user_id=current_user.id,
-                    type=source
-                ).first()
-                
-                if saving:
-                    saving.amount = float(saving.amount or 0) + amount
-                    db.session.add(saving)
-                else:
-                    # Create new saving record if doesn't exist
-                    saving = Saving(
-                        type=source,
-                        amount=amount,
-                        currency=current_user.default_currency,
-                        user_id=current_user.id,
-                        description=f'Updated from transaction: {description}'
-                    )
-                    db.session.add(saving)
-            else:
-                # For expense, subtract from the specified source (we already validated the balance)
-                saving = Saving.query.filter_by(
-                    user_id=current_user.id,
-                    type=source
-                ).first()
-                saving.amount = float(saving.amount or 0) - amount
-                db.session.add(saving)
-
+            mark_user_data_changed(current_user.id)
             db.session.commit()
             flash('Transaction created successfully!', 'success')
             
+        except InsufficientFundsError:
+            db.session.rollback()
+            flash(f'Insufficient funds in {source}. Another transaction used the available balance.', 'error')
         except Exception as e:
             db.session.rollback()
             app.logger.error(f'Error creating transaction: {str(e)}')
@@ -1253,112 +2364,361 @@ def create_transaction():
             
         return redirect(url_for('transactions'))
 
+# Bulk transaction import
+class ImportValidationError(Exception):
+    """Raised when rows of an import batch fail validation; nothing from the batch is written"""
+
+    def __init__(self, errors, total):
+        super().__init__(f'{total} row(s) failed validation')
+        self.errors = errors  # (row number, message) tuples, up to MAX_IMPORT_ERRORS of them
+        self.total = total
+
+def parse_import_rows(data, fmt):
+    """
+    Parse an import batch into a list of dicts with the IMPORT_FIELDS keys; missing fields are left out
+    data is the CSV text, or the decoded JSON: a list of objects or {"transactions": [...]}
+    """
+    if fmt == 'csv':
+        reader = csv.reader(StringIO(data.lstrip('\ufeff')))
+        header = [name.strip().lower() for name in next(reader, [])]
+        return [dict(zip(header, row)) for row in reader if row]
+    if isinstance(data, dict):
+        data = data.get('transactions')
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise ValueError('Expected a list of transaction objects')
+    return data
+
+def parse_import_date(value, default):
+    if not value:
+        return default
+    parsed = datetime.fromisoformat(str(value).strip())
+    return parsed.replace(tzinfo=None) if parsed.tzinfo else parsed
+
+def import_lookup_queries(user_id):
+    """The user's categories, active budgets, active budget items and accounts that an import checks rows against"""
+    return (
+        user_categories_query(user_id),
+        Budget.query.filter_by(user_id=user_id, archived=False),
+        BudgetItem.query.join(Budget).filter(
+            Budget.user_id == user_id, Budget.archived == False, BudgetItem.archived == False
+        ),
+        db.session.query(AccountBalance.source, AccountBalance.currency).filter_by(user_id=user_id),
+    )
+
+def import_transactions(user, rows, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    Validate and insert a batch of transactions for a user in one database transaction
+    Categories, budgets, budget items and balances are loaded once up front and each row is checked against
+    them in memory, with the same rules as create_transaction. Rows are inserted with executemany in chunks
+    of chunk_rows, then spent amounts and balances are adjusted once per budget item and source.
+    Raises ImportValidationError without writing anything if any row is invalid.
+    Returns a summary dict.
+    """
+    categories_query, budgets_query, budget_items_query, accounts_query = import_lookup_queries(user.id)
+    categories = {}
+    for category in categories_query:
+        categories[(category.type, str(category.id))] = category.id
+        categories.setdefault((category.type, category.name.lower()), category.id)
+
+    budgets = {budget.month: budget.id for budget in budgets_query}
+    budget_items = {(item.budget_id, item.category_id): item for item in budget_items_query}
+    accounts = {(balance.source, balance.currency) for balance in accounts_query}
+
+    now = datetime.now()
+    records = []
+    # Amounts are handled in integer minor units until the deltas are applied
+    spent_deltas = {}
+    balance_deltas = {}
+    errors = []
+    error_count = 0
+
+    for number, row in enumerate(rows, start=1):
+        try:
+            transaction_type = str(row.get('type') or '').strip().lower()
+            if transaction_type not in ('income', 'expense'):
+                raise ValueError("type must be 'income' or 'expense'")
+            amount = to_minor_units(row.get('amount'))
+            if not amount > 0:
+                raise ValueError('amount must be greater than zero')
+            description = str(row.get('description') or '').strip()
+            if not description:
+                raise ValueError('description is required')
+            if len(description) > 200:
+                raise ValueError('description is longer than 200 characters')
+            source = str(row.get('source') or '').strip()
+            if source not in SAVING_SOURCES:
+                raise ValueError(f'source must be one of {", ".join(SAVING_SOURCES)}')
+            currency = str(row.get('currency') or user.default_currency).strip().upper()
+            if currency not in SUPPORTED_CURRENCIES:
+                raise ValueError(f'unsupported currency {currency}')
+            transaction_date = parse_import_date(row.get('date'), now)
+
+            category_id = None
+            category = str(row.get('category') or '').strip()
+            if category:
+                category_id = categories.get((transaction_type, category.lower()))
+                if category_id is None:
+                    raise ValueError(f'unknown {transaction_type} category {category}')
+
+            if transaction_type == 'expense':
+                if (source, currency) not in accounts:
+                    raise ValueError(f'{source} account not found for {currency}')
+                if category_id:
+                    budget_id = budgets.get(transaction_date.date().replace(day=1))
+                    if budget_id is None:
+                        raise ValueError(f'no budget for {transaction_date:%B %Y}')
+                    budget_item = budget_items.get((budget_id, category_id))
+                    if budget_item is None:
+                        raise ValueError(f'{category} is not budgeted for {transaction_date:%B %Y}')
+                    spent_deltas[budget_item] = spent_deltas.get(budget_item, 0) + amount
+        except (KeyError, TypeError, ValueError) as e:
+            error_count += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append((number, str(e)))
+            continue
+
+        balance_key = (source, currency)
+        balance_deltas[balance_key] = balance_deltas.get(balance_key, 0) + (amount if transaction_type == 'income' else -amount)
+        # Stored the way the DateTime and Money column types store them, so rows can go straight to the driver
+        records.append((transaction_date.isoformat(sep=' ', timespec='microseconds'), transaction_type, amount,
+                        description, category_id, user.id, currency, source, False))
+
+    if error_count:
+        raise ImportValidationError(errors, error_count)
+
+    # Insert in date order so the date indexes are appended to rather than split at random pages
+    records.sort(key=itemgetter(0))
+
+    # executemany straight on the DBAPI cursor; building bind parameters through the ORM costs more than the insert
+    connection = db.session.connection()
+    insert = ('INSERT INTO "transaction" (date, type, amount, description, category_id, user_id, currency, source, '
+              'archived) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+    for start in range(0, len(records), chunk_rows):
+        connection.exec_driver_sql(insert, records[start:start + chunk_rows])
+
+    for budget_item, delta in spent_deltas.items():
+        add_spent_amount(budget_item, Decimal(delta).scaleb(-2))
+
+    # Expenses must not take a source below zero once the whole batch is applied
+    balance_deltas = {key: Decimal(delta).scaleb(-2) for key, delta in balance_deltas.items()}
+    for (source, currency), delta in balance_deltas.items():
+        adjust_balance(user.id, source, currency, delta, f'Imported {len(records)} transactions',
+                       allow_negative=delta >= 0)
+
+    if records:
+        mark_user_data_changed(user.id)
+    return {
+        'imported': len(records),
+        'budget_items_updated': len(spent_deltas),
+        'balances': {f'{source}/{currency}': float(delta) for (source, currency), delta in balance_deltas.items()}
+    }
+
+@app.route('/api/transactions/import', methods=['POST'])
+@login_required
+@check_timeout
+def api_import_transactions():
+    """Import a batch of transactions from a JSON body, a CSV body or an uploaded CSV/JSON file"""
+    try:
+        upload = request.files.get('file')
+        if upload:
+            text = upload.read().decode('utf-8-sig')
+            if upload.filename.lower().endswith('.json'):
+                rows = parse_import_rows(json.loads(text), 'json')
+            else:
+                rows = parse_import_rows(text, 'csv')
+        elif request.is_json:
+            rows = parse_import_rows(request.get_json(), 'json')
+        else:
+            rows = parse_import_rows(request.get_data(as_text=True), 'csv')
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'success': False, 'message': f'Could not read import: {str(e)}'}), 400
+
+    try:
+        summary = import_transactions(current_user, rows)
+        db.session.commit()
+    except ImportValidationError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'{e.total} row(s) failed validation; nothing was imported',
+            'errors': [{'row': number, 'message': message} for number, message in e.errors]
+        }), 400
+    except InsufficientFundsError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f'Error importing transactions: {str(e)}')
+        return jsonify({'success': False, 'message': 'Error importing transactions. Please try again.'}), 500
+
+    return jsonify({'success': True, **summary})
+
+def iter_csv(header, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield a CSV document as UTF-8 encoded chunks of up to chunk_rows rows"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    
+    # Send the header straight away so the download starts before the query runs
+    writer.writerow(header)
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')  # UTF-8 with BOM for Excel compatibility
+    buffer.seek(0)
+    buffer.truncate()
+    
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % chunk_rows == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def count_export_bytes(chunks, export):
+    for chunk in chunks:
+        EXPORT_BYTES.labels(export).inc(len(chunk))
+        yield chunk
+
+def csv_response(chunks, filename):
+    """Stream CSV chunks to the client as a file download"""
+    return Response(
+        stream_with_context(count_export_bytes(chunks, request.endpoint)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def transaction_export_query(user_id):
+    """All of a user's transactions newest first, archived ones included, with the category name joined in"""
+    def transactions(model):
+        return db.session.query(
+            model.date,
+            model.type,
+            model.amount,
+            model.currency,
+            model.description,
+            Category.name,
+            model.source
+        ).outerjoin(Category, model.category_id == Category.id)\
+            .filter(model.user_id == user_id)
+
+    return transactions(Transaction).union_all(transactions(ArchivedTransaction))\
+        .order_by(Transaction.date.desc())
+
 @app.route('/export_transactions')
 @login_required
 def export_transactions():
     """Export user's transactions to CSV"""
-    # Create a StringIO object to write CSV data
-    si = StringIO()
-    cw = csv.writer(si)
-    
-    # Write headers
-    cw.writerow(['Date', 'Type', 'Amount', 'Currency', 'Description', 'Category', 'Source'])
-    
-    # Get all transactions for the user
-    transactions = Transaction.query.filter_by(user_id=current_user.id).order_by(Transaction.date.desc()).all()
-    
-    # Write transaction data
-    for transaction in transactions:
-        category_name = transaction.category.name if transaction.category else 'N/A'
-        cw.writerow([
-            transaction.date.strftime('%Y-%m-%d %H:%M:%S'),
-            transaction.type,
-            transaction.amount,
-            transaction.currency,
-            transaction.description,
-            category_name,
-            transaction.source
-        ])
-    
-    # Create the response
-    output = si.getvalue()
-    si.close()
+    # Rows are fetched in batches from a server-side cursor and streamed as they arrive
+    rows = (
+        [
+            row.date.strftime('%Y-%m-%d %H:%M:%S'),
+            row.type,
+            row.amount,
+            row.currency,
+            row.description,
+            row.name or 'N/A',
+            row.source
+        ]
+        for row in transaction_export_query(current_user.id).yield_per(EXPORT_CHUNK_ROWS)
+    )
     
     # Generate filename with current timestamp
     filename = f'transactions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
     
-    # Convert string to bytes
-    bytes_output = BytesIO()
-    bytes_output.write(output.encode('utf-8-sig'))  # Use UTF-8 with BOM for Excel compatibility
-    bytes_output.seek(0)
-    
-    return send_file(
-        bytes_output,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
+    return csv_response(
+        iter_csv(['Date', 'Type', 'Amount', 'Currency', 'Description', 'Category', 'Source'], rows),
+        filename
     )
 
-@app.route('/export_budgets')
-@login_required
-def export_budgets():
-    """Export user's budgets to CSV"""
-    # Create a StringIO object to write CSV data
-    si = StringIO()
-    cw = csv.writer(si)
-    
-    # Write headers for budget summary
-    cw.writerow(['Budget Month', 'Total Amount', 'Currency', 'Created At', 'Updated At', 'Status'])
-    cw.writerow([])  # Empty row for separation
-    
-    # Get all budgets for the user
-    budgets = Budget.query.filter_by(user_id=current_user.id).order_by(Budget.month.desc()).all()
-    
-    # Write budget data
-    for budget in budgets:
-        status = 'Archived' if budget.archived else 'Active'
-        cw.writerow([
-            budget.month.strftime('%Y-%m'),
-            budget.total_amount,
-            budget.currency,
-            budget.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            budget.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
-            status
-        ])
+def budget_export_query(user_id):
+    """
+    All of a user's budgets newest first, archived ones included, one row per budget item with the
+    category name joined in
+    """
+    def budgets(budget_model, item_model, archived):
+        return db.session.query(
+            budget_model.id,
+            budget_model.month,
+            budget_model.total_amount,
+            budget_model.currency,
+            budget_model.created_at,
+            budget_model.updated_at,
+            archived.label('archived'),
+            item_model.id.label('item_id'),
+            Category.name.label('category_name'),
+            item_model.planned_amount,
+            item_model.spent_amount,
+            item_model.description
+        ).outerjoin(item_model, item_model.budget_id == budget_model.id)\
+            .outerjoin(Category, item_model.category_id == Category.id)\
+            .filter(budget_model.user_id == user_id)
+
+    return budgets(Budget, BudgetItem, Budget.archived)\
+        .union_all(budgets(ArchivedBudget, ArchivedBudgetItem, db.literal(True)))\
+        .order_by(Budget.month.desc(), Budget.id, db.literal_column('item_id'))
+
+def budget_columns(row):
+    return [
+        row.month.strftime('%Y-%m'),
+        row.total_amount,
+        row.currency,
+        row.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        row.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'Archived' if row.archived else 'Active'
+    ]
+
+def budget_item_columns(row):
+    return [
+        row.category_name,
+        row.planned_amount,
+        row.spent_amount,
+        row.description or 'N/A'
+    ]
+
+def iter_budget_report_rows(rows):
+    """Budget summary rows, each followed by a table of its items"""
+    yield []  # Empty row for separation
+    for _, budget_rows in groupby(rows, key=lambda row: row.id):
+        budget_rows = list(budget_rows)
+        yield budget_columns(budget_rows[0])
         
         # Add budget items header
-        cw.writerow([])
-        cw.writerow(['Category', 'Planned Amount', 'Spent Amount', 'Description'])
+        yield []
+        yield ['Category', 'Planned Amount', 'Spent Amount', 'Description']
+        for row in budget_rows:
+            if row.item_id is not None:
+                yield budget_item_columns(row)
         
-        # Write budget items
-        for item in budget.items:
-            cw.writerow([
-                item.category.name,
-                item.planned_amount,
-                item.spent_amount,
-                item.description or 'N/A'
-            ])
-        
-        cw.writerow([])  # Empty row between budgets
+        yield []  # Empty row between budgets
+
+def iter_budget_flat_rows(rows):
+    """One row per budget item with the budget columns repeated; budgets without items get one row"""
+    for row in rows:
+        if row.item_id is None:
+            yield budget_columns(row) + ['', '', '', '']
+        else:
+            yield budget_columns(row) + budget_item_columns(row)
+
+@app.route('/export_budgets')
+@login_required
+def export_budgets():
+    """
+    Export user's budgets to CSV
+    ?format=flat writes one row per budget item instead of the grouped report
+    """
+    budget_header = ['Budget Month', 'Total Amount', 'Currency', 'Created At', 'Updated At', 'Status']
+    rows = budget_export_query(current_user.id).yield_per(EXPORT_CHUNK_ROWS)
     
-    # Create the response
-    output = si.getvalue()
-    si.close()
+    if request.args.get('format') == 'flat':
+        header = budget_header + ['Category', 'Planned Amount', 'Spent Amount', 'Description']
+        chunks = iter_csv(header, iter_budget_flat_rows(rows))
+    else:
+        chunks = iter_csv(budget_header, iter_budget_report_rows(rows))
     
     # Generate filename with current timestamp
     filename = f'budgets_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
     
-    # Convert string to bytes
-    bytes_output = BytesIO()
-    bytes_output.write(output.encode('utf-8-sig'))  # Use UTF-8 with BOM for Excel compatibility
-    bytes_output.seek(0)
-    
-    return send_file(
-        bytes_output,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
-    )
+    return csv_response(chunks, filename)
 
 @app.route('/category/add', methods=['POST'])
 @login_required
@@ -1374,27 +2734,31 @@ def add_category():
                 'message': 'Invalid category details provided.'
             }), 400
 
-        # Check if category already exists for this user
-        existing_category = Category.query.filter_by(
-            user_id=current_user.id,
-            name=name,
-            type=type
-        ).first()
-
-        if existing_category:
-            return jsonify({
-                'status': 'error',
-                'message': f'A {type} category with this name already exists.'
-            }), 400
+        # Adding a shared category the user had hidden brings it back instead of creating a copy
+        hidden_category = hidden_categories_query(current_user.id).filter_by(name=name, type=type).first()
 
-        # Create new category
-        new_category = Category(
-            name=name,
-            type=type,
-            user_id=current_user.id
-        )
+        if hidden_category:
+            new_category = db.session.get(Category, hidden_category.overrides_id)
+            db.session.delete(hidden_category)
+        else:
+            # Check if category already exists for this user
+            existing_category = user_category_by_name_query(current_user.id, type, name).first()
+
+            if existing_category:
+                return jsonify({
+                    'status': 'error',
+                    'message': f'A {type} category with this name already exists.'
+                }), 400
+
+            # Create new category
+            new_category = Category(
+                name=name,
+                type=type,
+                user_id=current_user.id
+            )
+            db.session.add(new_category)
 
-        db.session.add(new_category)
+        mark_categories_changed(current_user.id)
         db.session.commit()
 
         return jsonify({
@@ -1403,8 +2767,10 @@ def add_category():
             'category': {
                 'id': new_category.id,
                 'name': new_category.name,
-                'type': new_category.type
-            }
+                'type': new_category.type,
+                'is_default': bool(new_category.is_default)
+            },
+            'category_version': current_category_version(current_user)
         })
 
     except Exception as e:
@@ -1421,33 +2787,41 @@ def delete_category(category_id):
     try:
         category = Category.query.get_or_404(category_id)
         
-        # Check if user owns this category
-        if category.user_id != current_user.id:
+        # Check if user owns this category (shared categories belong to everyone)
+        if category.user_id not in (None, current_user.id) or category.hidden:
             return jsonify({
                 'status': 'error',
                 'message': 'Unauthorized access.'
             }), 403
             
-        # Prevent deletion of default categories
-        if category.is_default:
-            return jsonify({
-                'status': 'error',
-                'message': 'Cannot delete default categories.'
-            }), 400
-            
-        # Check if category is in use
-        if category.transactions or category.budget_items:
+        # Check if category is in use by this user
+        in_use = any(db.session.query(query.exists()).scalar() for query in category_usage_queries(current_user.id, category.id))
+        if in_use:
             return jsonify({
                 'status': 'error',
                 'message': 'Cannot delete category that is in use. Remove all transactions and budget items first.'
             }), 400
 
-        db.session.delete(category)
+        if category.user_id is None:
+            # Shared categories are hidden for this user rather than deleted
+            db.session.add(Category(
+                name=category.name,
+                type=category.type,
+                user_id=current_user.id,
+                overrides_id=category.id,
+                hidden=True
+            ))
+            message = 'Category hidden. Restore default categories to bring it back.'
+        else:
+            db.session.delete(category)
+            message = 'Category deleted successfully!'
+        mark_categories_changed(current_user.id)
         db.session.commit()
 
         return jsonify({
             'status': 'success',
-            'message': 'Category deleted successfully!'
+            'message': message,
+            'category_version': current_category_version(current_user)
         })
 
     except Exception as e:
@@ -1459,27 +2833,194 @@ def delete_category(category_id):
 
 @app.route('/get_categories')
 @login_required
+@check_timeout
+@category_version_etag
 def get_all_categories():
-    categories = Category.query.filter_by(user_id=current_user.id).all()
+    categories = user_categories_query(current_user.id).all()
     return jsonify([{
         'id': category.id,
         'name': category.name,
         'type': category.type,
-        'is_default': category.is_default
+        'is_default': bool(category.is_default)
     } for category in categories])
 
+# Mail queue
+def queue_mail(subject, recipients, body):
+    """Add a message to the outbound queue in the current transaction; call mail_worker.wake() after committing"""
+    message = OutboundMail(subject=subject, recipients=','.join(recipients), body=body)
+    db.session.add(message)
+    return message
+
+def due_mail_query(now, limit):
+    """Ids of the limit longest-due messages"""
+    return db.session.query(OutboundMail.id).filter(OutboundMail.next_attempt_at <= now)\
+        .order_by(OutboundMail.next_attempt_at).limit(limit)
+
+def pending_mail_count_query():
+    """Messages still to be sent or retried; given-up messages have no next attempt"""
+    return db.select(db.func.count()).where(OutboundMail.next_attempt_at.is_not(None))
+
+def claim_mail_batch(batch_size):
+    """
+    Claim up to batch_size due messages by pushing their next attempt past the lease
+    The UPDATE only takes messages that are still due, so a message another worker claimed after the SELECT is
+    skipped, and the claimed rows are read back by their new lease. No UPDATE ... RETURNING, which needs SQLite 3.35.
+    """
+    now = datetime.now()
+    lease_until = now + timedelta(seconds=app.config['MAIL_QUEUE_LEASE'])
+    due = [row.id for row in due_mail_query(now, batch_size)]
+    if not due:
+        db.session.commit()
+        return []
+    db.session.execute(
+        db.update(OutboundMail)
+            .where(OutboundMail.id.in_(due), OutboundMail.next_attempt_at <= now)
+            .values(next_attempt_at=lease_until, attempts=OutboundMail.attempts + 1),
+        execution_options={'synchronize_session': False}
+    )
+    claimed = OutboundMail.query.filter(OutboundMail.id.in_(due), OutboundMail.next_attempt_at == lease_until)\
+        .populate_existing().all()
+    db.session.commit()
+    return claimed
+
+def mail_retry_delay(attempts):
+    """Exponential backoff after a failed attempt"""
+    return min(app.config['MAIL_RETRY_DELAY'] * 2 ** (attempts - 1), app.config['MAIL_RETRY_MAX_DELAY'])
+
+def drain_mail_queue(batch_size=None):
+    """
+    Send one batch of due messages over a single SMTP connection
+    Sent messages are deleted. Failed ones are retried with backoff until MAIL_MAX_ATTEMPTS, then kept with
+    next_attempt_at NULL and the last error, and their body cleared since it may hold a live reset link.
+    Returns (claimed, sent).
+    """
+    batch = claim_mail_batch(batch_size or app.config['MAIL_QUEUE_BATCH_SIZE'])
+    if not batch:
+        return 0, 0
+
+    sent, failed = [], {}
+    try:
+        with mail.connect() as connection:
+            for message in batch:
+                try:
+                    connection.send(Message(message.subject, recipients=message.recipients.split(','),
+                                            body=message.body))
+                    sent.append(message.id)
+                except Exception as e:
+                    failed[message.id] = e
+    except Exception as e:
+        # Could not reach the server, so every unsent message in the batch failed
+        failed.update({message.id: e for message in batch if message.id not in sent and message.id not in failed})
+
+    if sent:
+        db.session.execute(db.delete(OutboundMail).where(OutboundMail.id.in_(sent)))
+    now = datetime.now()
+    for message in batch:
+        if message.id in failed:
+            give_up = message.attempts >= app.config['MAIL_MAX_ATTEMPTS']
+            db.session.execute(db.update(OutboundMail).where(OutboundMail.id == message.id).values(
+                next_attempt_at=None if give_up else now + timedelta(seconds=mail_retry_delay(message.attempts)),
+                last_error=f'{type(failed[message.id]).__name__}: {failed[message.id]}'[:500],
+                **({'body': ''} if give_up else {})
+            ))
+            app.logger.warning('Mail %s attempt %s failed%s: %s', message.id, message.attempts,
+                               ', giving up' if give_up else '', failed[message.id])
+    db.session.commit()
+    return len(batch), len(sent)
+
+class MailQueueWorker:
+    """
+    Background thread that drains the mail queue
+    It is started by the first request each process handles, wakes when this process queues a message and
+    every MAIL_QUEUE_POLL_INTERVAL seconds, which picks up retries and messages queued by other processes.
+    """
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            # A forked worker process inherits the object but not the thread
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name='mail-queue', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        if app.config['MAIL_QUEUE_WORKER']:
+            self.start()
+            self._wake.set()
+
+    def run(self, stop=None):
+        while stop is None or not stop.is_set():
+            self._wake.wait(app.config['MAIL_QUEUE_POLL_INTERVAL'])
+            self._wake.clear()
+            with app.app_context():
+                try:
+                    while drain_mail_queue()[0] == app.config['MAIL_QUEUE_BATCH_SIZE']:
+                        pass
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Draining the mail queue failed')
+
+mail_worker = MailQueueWorker()
+
+if app.config['MAIL_QUEUE_WORKER']:
+    # Started per request rather than at import, so CLI commands get no thread and forked processes get their own
+    app.before_request(mail_worker.start)
+
+# Metrics endpoint
+class AppMetricsCollector:
+    """
+    The samples every process wrote to METRICS_DIR, merged, plus values worked out at scrape time:
+    cache hit ratios from the merged lookup counts and the mail queue depth from the database
+    Under the flask CLI only this process's in-memory samples are reported.
+    """
+
+    def collect(self):
+        lookups = {}
+        source = multiprocess.MultiProcessCollector(None) if METRICS_MULTIPROCESS else REGISTRY
+        for metric in source.collect():
+            if metric.name == 'cache_lookups':
+                for sample in metric.samples:
+                    results = lookups.setdefault(sample.labels['cache'], {})
+                    results[sample.labels['result']] = results.get(sample.labels['result'], 0) + sample.value
+            yield metric
+
+        ratio = GaugeMetricFamily('cache_hit_ratio', 'Share of cache lookups that were hits, across all processes',
+                                  labels=['cache'])
+        for cache, results in sorted(lookups.items()):
+            total = sum(results.values())
+            ratio.add_metric([cache], results.get('hit', 0) / total if total else 0.0)
+        yield ratio
+
+        depth = db.session.scalar(pending_mail_count_query())
+        yield GaugeMetricFamily('mail_queue_depth', 'Messages waiting to be sent', value=depth)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text format metrics for every app process"""
+    token = app.config['METRICS_TOKEN']
+    if not app.config['METRICS_ENABLED'] or not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    registry = CollectorRegistry()
+    registry.register(AppMetricsCollector())
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
 def send_reset_email(user):
-    """Send password reset email to user"""
+    """Queue a password reset email for the user"""
     token = user.get_reset_token()
-    msg = Message('Password Reset Request',
-                recipients=[user.email])
-    msg.body = f'''To reset your password, visit the following link:
+    queue_mail('Password Reset Request', [user.email], f'''To reset your password, visit the following link:
 {url_for('reset_password', token=token, _external=True)}
 
 If you did not make this request, please ignore this email.
 The link will expire in 1 hour.
-'''
-    mail.send(msg)
+''')
+    db.session.commit()
+    mail_worker.wake()
 
 @app.route('/reset_password', methods=['GET', 'POST'])
 def request_reset():
@@ -1488,7 +3029,7 @@ def request_reset():
     
     if request.method == 'POST':
         email = request.form['email']
-        user = User.query.filter_by(email=email).first()
+        user = user_by_email_query(email).first()
         if user:
             send_reset_email(user)
             flash('An email has been sent with instructions to reset your password.', 'info')
@@ -1519,6 +3060,7 @@ def reset_password(token):
         
         user.set_password(password)
         db.session.commit()
+        invalidate_user_cache(user.id)
         flash('Your password has been updated! You can now log in.', 'success')
         return redirect(url_for('login'))
     
@@ -1527,19 +3069,12 @@ def reset_password(token):
 @app.route('/create_default_categories')
 @login_required
 def create_default_categories():
-    # Create default categories for the user
-    default_categories = Category.get_default_categories()
-    for category in default_categories:
-        new_category = Category(
-            name=category['name'],
-            type=category['type'],
-            user_id=current_user.id,
-            is_default=True  # Mark as default category
-        )
-        db.session.add(new_category)
+    # Default categories are shared, so restoring them just drops the user's hidden flags
+    hidden_categories_query(current_user.id).delete(synchronize_session=False)
+    mark_categories_changed(current_user.id)
     db.session.commit()
 
-    flash('Default categories have been created.', 'success')
+    flash('Default categories have been restored.', 'success')
     return redirect(url_for('budget'))
 
 def init_db():
@@ -1549,6 +3084,9 @@ def init_db():
         
         # Create all tables
         db.create_all()
+
+        # Mark the fresh schema as up to date so `flask db upgrade` only applies newer migrations
+        stamp()
         
         # Create default admin user if it doesn't exist
         admin_user = User.query.filter_by(username=os.getenv('ADMIN_USERNAME', 'admin')).first()
@@ -1559,18 +3097,469 @@ def init_db():
                 default_currency=os.getenv('ADMIN_DEFAULT_CURRENCY')
             )
             admin_user.set_password(os.getenv('ADMIN_PASSWORD'))
-            
-            # Create default categories for admin user
-            for category_data in Category.get_default_categories():
-                category = Category(
-                    name=category_data['name'],
-                    type=category_data['type'],
-                    user_id=1  # This will be the admin user's ID
-                )
-                db.session.add(category)
-            
             db.session.add(admin_user)
-            db.session.commit()
+
+        # Default categories are shared by every user
+        create_shared_categories()
+        db.session.commit()
+
+# Synthetic data
+SEED_CURRENCY_WEIGHTS = {'ZMW': 70, 'USD': 10, 'ZAR': 10, 'GBP': 5, 'EUR': 5}  # Users' default currencies
+SEED_SOURCE_WEIGHTS = {'bank': 5, 'mobile_money': 3, 'cash': 2}
+SEED_FOREIGN_SHARE = 0.1  # Share of transactions not in the user's default currency
+SEED_INCOME_SHARE = 0.1
+# Amount range of one transaction in major units, by category name
+SEED_AMOUNTS = {
+    'Salary': (8000, 25000), 'Freelance': (500, 6000), 'Investment': (100, 3000), 'Business': (500, 10000),
+    'Rental Income': (1500, 6000), 'Housing': (1500, 8000), 'Utilities': (100, 900), 'Transportation': (20, 400),
+    'Food & Groceries': (30, 900), 'Healthcare': (50, 1500), 'Entertainment': (40, 600), 'Shopping': (50, 2000),
+    'Education': (200, 5000), 'Communication': (20, 300), 'Personal Care': (20, 400), 'Charity & Gifts': (20, 1000),
+    'Insurance': (150, 1200), 'Debt Payment': (300, 4000),
+}
+SEED_DEFAULT_AMOUNT = (20, 800)
+# Categories some users add for themselves
+SEED_CUSTOM_CATEGORIES = [('School Fees', 'expense'), ('Farm Inputs', 'expense'), ('Church Tithe', 'expense'),
+                          ('Family Support', 'expense'), ('Side Hustle', 'income'), ('Chilimba Payout', 'income')]
+SEED_INVESTMENT_TYPES = ('stocks', 'bonds', 'mutual_funds', 'real_estate', 'crypto', 'other')
+TRANSACTION_COLUMNS = ('date', 'type', 'amount', 'description', 'category_id', 'user_id', 'currency', 'source',
+                       'archived')
+
+def stored_datetime(value):
+    """A datetime in the text format the DateTime column type stores, for rows written straight to the driver"""
+    return value.isoformat(sep=' ', timespec='microseconds')
+
+def insert_driver_rows(table, columns, rows, batch_rows=SEED_BATCH_ROWS):
+    """executemany rows of stored values into table straight on the DBAPI cursor, batch_rows at a time"""
+    statement = f'INSERT INTO "{table}" ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+    connection = db.session.connection()
+    for start in range(0, len(rows), batch_rows):
+        connection.exec_driver_sql(statement, rows[start:start + batch_rows])
+    return len(rows)
+
+def seed_user_transactions(rng, user_id, currency, expense, income, start, end, count, batch_rows):
+    """
+    Write count transactions for one user between start and end, in date order
+    expense and income are (id, name) pairs of the categories to use. Returns (spent, opening, balances,
+    month_end): minor units spent per (month, category id), and per (source, currency) the opening balance,
+    which is just enough to never go below zero, the final balance and the balance at the end of each month.
+    """
+    sources = list(SEED_SOURCE_WEIGHTS)
+    source_weights = list(SEED_SOURCE_WEIGHTS.values())
+    foreign = [code for code in SUPPORTED_CURRENCIES if code != currency]
+    span = (end - start).total_seconds()
+
+    spent = {}
+    running = {}
+    lowest = {}
+    month_end = {}
+    rows = []
+    for offset in sorted(rng.random() for _ in range(count)):
+        when = start + timedelta(seconds=offset * span)
+        source = rng.choices(sources, source_weights)[0]
+        tx_currency = rng.choice(foreign) if rng.random() < SEED_FOREIGN_SHARE else currency
+        kind = 'income' if rng.random() < SEED_INCOME_SHARE else 'expense'
+        category_id, name = rng.choice(income if kind == 'income' else expense)
+        low, high = SEED_AMOUNTS.get(name, SEED_DEFAULT_AMOUNT)
+        amount = rng.randint(low * MINOR_UNITS, high * MINOR_UNITS)
+
+        key = (source, tx_currency)
+        running[key] = running.get(key, 0) + (amount if kind == 'income' else -amount)
+        lowest[key] = min(lowest.get(key, 0), running[key])
+        month = when.date().replace(day=1)
+        month_end[(month,) + key] = running[key]
+        if kind == 'expense':
+            # Every currency counts towards the budget item, the way spent_amount_drift_query sums it
+            spent[month, category_id] = spent.get((month, category_id), 0) + amount
+
+        rows.append((stored_datetime(when), kind, amount, name, category_id, user_id, tx_currency, source, False))
+        if len(rows) == batch_rows:
+            insert_driver_rows('transaction', TRANSACTION_COLUMNS, rows, batch_rows)
+            rows = []
+    insert_driver_rows('transaction', TRANSACTION_COLUMNS, rows, batch_rows)
+
+    opening = {key: rng.randint(500, 20000) * MINOR_UNITS - low for key, low in lowest.items()}
+    balances = {key: opening[key] + amount for key, amount in running.items()}
+    month_end = {key: opening[key[1:]] + amount for key, amount in month_end.items()}
+    return spent, opening, balances, month_end
+
+def seed_synthetic_data(users, transactions, months, random_seed, until, prefix='seed',
+                        users_per_chunk=SEED_USERS_PER_CHUNK, batch_rows=SEED_BATCH_ROWS):
+    """
+    Generate users with categories, monthly budgets, transactions, savings snapshots and investments
+    Each user draws from its own generator seeded with random_seed and its number, so the data does not depend
+    on users_per_chunk. Transactions fall in the months up to until. Spent amounts match each month's expenses
+    and balances match each source's transactions. Rows are written straight to the driver with executemany and
+    committed every users_per_chunk users. Returns the number of rows written per table.
+    """
+    usernames = [f'{prefix}{number}' for number in range(users)]
+    create_shared_categories()
+    shared = db.session.execute(
+        db.select(Category.id, Category.name, Category.type).where(Category.user_id.is_(None))
+    ).all()
+    month_starts = [until.replace(day=1)]
+    while len(month_starts) < months:
+        month_starts.append((month_starts[-1] - timedelta(days=1)).replace(day=1))
+    month_starts.reverse()
+    start = datetime.combine(month_starts[0], datetime.min.time())
+    end = datetime.combine(until, datetime.min.time()) + timedelta(days=1)
+    # One hash for everyone; hashing a password per user would take longer than the rest of the data
+    password_hash = hash_password(f'{prefix}#Password1')
+    currencies = list(SEED_CURRENCY_WEIGHTS)
+    currency_weights = list(SEED_CURRENCY_WEIGHTS.values())
+
+    counts = dict.fromkeys(['user', 'category', 'transaction', 'budget', 'budget_item', 'saving',
+                            'account_balance', 'investment'], 0)
+    for chunk_start in range(0, users, users_per_chunk):
+        chunk = usernames[chunk_start:chunk_start + users_per_chunk]
+        taken = db.session.scalars(db.select(User.username).where(User.username.in_(chunk)).limit(1)).first()
+        if taken:
+            raise ValueError(f'User {taken} already exists; seed with another prefix')
+        rngs = {username: random.Random(f'{random_seed}:{username}') for username in chunk}
+        user_currency = {username: rng.choices(currencies, currency_weights)[0] for username, rng in rngs.items()}
+        counts['user'] += insert_driver_rows('user', ('username', 'email', 'password_hash', 'default_currency',
+                                                      'auth_version'), [
+            (username, f'{username}@example.com', password_hash, user_currency[username], 1) for username in chunk
+        ], batch_rows)
+        user_ids = dict(db.session.execute(db.select(User.username, User.id).where(User.username.in_(chunk))).all())
+
+        counts['category'] += insert_driver_rows('category', ('name', 'type', 'user_id', 'is_default', 'hidden'), [
+            (name, kind, user_ids[username], False, False)
+            for username, rng in rngs.items()
+            for name, kind in rng.sample(SEED_CUSTOM_CATEGORIES, k=rng.randint(0, 2))
+        ], batch_rows)
+        custom = {}
+        for category_id, name, kind, user_id in db.session.execute(
+            db.select(Category.id, Category.name, Category.type, Category.user_id)
+            .where(Category.user_id.in_(user_ids.values()))
+        ):
+            custom.setdefault(user_id, []).append((category_id, name, kind))
+
+        budgets = []
+        items = {}
+        savings = []
+        balances = []
+        investments = []
+        for username, rng in rngs.items():
+            user_id = user_ids[username]
+            currency = user_currency[username]
+            categories = shared + custom.get(user_id, [])
+            income = [(c[0], c[1]) for c in categories if c[2] == 'income']
+            # Expenses only go to categories in the budget, as create_transaction requires
+            expense = [(c[0], c[1]) for c in categories if c[2] == 'expense']
+            budgeted = rng.sample(expense, k=min(len(expense), rng.randint(5, 9)))
+
+            spent, opening, final, month_end = seed_user_transactions(
+                rng, user_id, currency, budgeted, income, start, end, transactions, batch_rows
+            )
+            counts['transaction'] += transactions
+
+            for month in month_starts:
+                planned = {}
+                for category_id, name in budgeted:
+                    low, high = SEED_AMOUNTS.get(name, SEED_DEFAULT_AMOUNT)
+                    amount = max(spent.get((month, category_id), 0) * rng.uniform(0.9, 1.3), high * MINOR_UNITS)
+                    planned[category_id] = int(amount // (50 * MINOR_UNITS) + 1) * 50 * MINOR_UNITS
+                created = stored_datetime(max(start, datetime.combine(month, datetime.min.time())))
+                total = sum(planned.values()) + rng.randint(0, 20) * 100 * MINOR_UNITS
+                budgets.append((month.isoformat(), total, currency, user_id, False, created, created))
+                items[user_id, month] = [
+                    (category_id, amount, spent.get((month, category_id), 0)) for category_id, amount in planned.items()
+                ]
+
+            for (source, tx_currency), amount in opening.items():
+                savings.append((source, amount, tx_currency, user_id, 'Opening balance', stored_datetime(start)))
+            for (month, source, tx_currency), amount in sorted(month_end.items()):
+                month_close = min(datetime.combine(month_bounds(month)[1], datetime.min.time()), end)
+                savings.append((source, amount, tx_currency, user_id, f'Balance at the end of {month:%B %Y}',
+                                stored_datetime(month_close - timedelta(microseconds=1))))
+            for (source, tx_currency), amount in final.items():
+                balances.append((user_id, source, tx_currency, amount, stored_datetime(end), 1))
+
+            for _ in range(rng.randint(0, 4)):
+                initial = rng.randint(1000, 50000) * MINOR_UNITS
+                investments.append((rng.choice(SEED_INVESTMENT_TYPES), initial, int(initial * rng.uniform(0.7, 1.6)),
+                                    currency, user_id, 'Synthetic holding', stored_datetime(end)))
+
+        counts['budget'] += insert_driver_rows('budget', ('month', 'total_amount', 'currency', 'user_id', 'archived',
+                                                          'created_at', 'updated_at'), budgets, batch_rows)
+        budget_ids = db.session.execute(
+            db.select(Budget.user_id, Budget.month, Budget.id).where(Budget.user_id.in_(user_ids.values()))
+        ).all()
+        counts['budget_item'] += insert_driver_rows('budget_item', ('budget_id', 'category_id', 'planned_amount',
+                                                                    'spent_amount', 'archived', 'version'), [
+            (budget_id, category_id, planned, spent, False, 1)
+            for user_id, month, budget_id in budget_ids
+            for category_id, planned, spent in items[user_id, month]
+        ], batch_rows)
+        counts['saving'] += insert_driver_rows('saving', ('type', 'amount', 'currency', 'user_id', 'description',
+                                                          'date'), savings, batch_rows)
+        counts['account_balance'] += insert_driver_rows('account_balance', ('user_id', 'source', 'currency',
+                                                                            'amount', 'updated_at', 'version'),
+                                                        balances, batch_rows)
+        counts['investment'] += insert_driver_rows('investment', ('type', 'initial_value', 'current_value',
+                                                                  'currency', 'user_id', 'description',
+                                                                  'last_updated'), investments, batch_rows)
+        db.session.commit()
+    return counts
+
+# Query plan checks
+def route_queries(user_id):
+    """
+    Queries issued by each route, keyed by route name
+    Every entry comes from the helper the route itself calls, so a change to a route's query is checked too.
+    """
+    current_month = date.today().replace(day=1)
+    rates = {'USD': 1.0, 'ZMW': 0.04}
+
+    return {
+        'index': [
+            fx_rates_query(current_month),
+            current_budget_query(user_id),
+            account_balances_query(user_id),
+            consolidated_balance_query(user_id, 'ZMW', rates),
+            investment_totals_query(user_id, 'ZMW', rates),
+            recent_transactions_query(user_id),
+        ],
+        'transactions': [
+            transactions_page_query(user_id, 'ZMW').limit(TRANSACTIONS_PER_PAGE + 1),
+            transactions_page_query(user_id, 'ZMW', (datetime.now(), 1)).limit(TRANSACTIONS_PER_PAGE + 1),
+            user_categories_query(user_id, 'expense'),
+        ],
+        'get_categories': [user_categories_query(user_id, 'expense')],
+        'analytics': [
+            monthly_totals_query(user_id, 'ZMW', current_month),
+            category_spend_query(user_id, 'ZMW', current_month),
+            budget_utilisation_query(user_id, current_month),
+        ],
+        'get_all_categories': [user_categories_query(user_id)],
+        'delete_transaction': [month_budget_query(user_id, current_month), budget_item_query(1, 1)],
+        'create_transaction': [month_budget_query(user_id, current_month), budget_item_query(1, 1)],
+        'import_transactions': list(import_lookup_queries(user_id)),
+        'budget': [
+            user_categories_query(user_id, 'expense'),
+            month_budget_query(user_id, current_month),
+            active_budget_items_query(1),
+        ],
+        'edit_budget_item': [other_items_planned_query(1, 1), spent_amount_drift_query(current_month, [user_id])],
+        'view_archived_budgets': archived_budget_queries(user_id),
+        'finance': [account_balances_query(user_id), investments_query(user_id)],
+        'export_transactions': [transaction_export_query(user_id)],
+        'export_budgets': [budget_export_query(user_id)],
+        'add_category': [
+            hidden_categories_query(user_id).filter_by(name='Salary', type='income'),
+            user_category_by_name_query(user_id, 'income', 'Salary'),
+        ],
+        'delete_category': [query.limit(1) for query in category_usage_queries(user_id, 1)],
+        'create_default_categories': [hidden_categories_query(user_id)],
+        'login': [user_by_username_query('admin')],
+        'request_reset': [user_by_email_query('admin@example.com')],
+        'archive_rows': [archivable_ids_query(Budget, ARCHIVE_BATCH_ROWS), archivable_ids_query(Transaction, ARCHIVE_BATCH_ROWS)],
+        'drain_mail': [due_mail_query(datetime.now(), app.config['MAIL_QUEUE_BATCH_SIZE'])],
+        'metrics': [pending_mail_count_query()],
+    }
+
+def explain_query_plan(query):
+    """Run an ORM query or a select() and return (statement, plan details) for each SELECT it issued"""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        query.all() if hasattr(query, 'all') else db.session.execute(query).all()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    connection = db.session.connection()
+    return [
+        (statement, [row[3] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)])
+        for statement, parameters in captured
+    ]
+
+@app.cli.command('import-transactions')
+@click.argument('username')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help='Defaults to the file extension.')
+@click.option('--chunk-rows', default=IMPORT_CHUNK_ROWS, show_default=True, help='Rows per executemany batch.')
+def import_transactions_command(username, path, fmt, chunk_rows):
+    """Import a CSV or JSON file of transactions for USERNAME."""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        click.echo(f'User {username} not found')
+        sys.exit(1)
+
+    fmt = fmt or ('json' if path.lower().endswith('.json') else 'csv')
+    with open(path, encoding='utf-8-sig') as f:
+        rows = parse_import_rows(json.load(f) if fmt == 'json' else f.read(), fmt)
+
+    started = time.perf_counter()
+    try:
+        summary = import_transactions(user, rows, chunk_rows=chunk_rows)
+        db.session.commit()
+    except ImportValidationError as e:
+        db.session.rollback()
+        for number, message in e.errors:
+            click.echo(f'row {number}: {message}')
+        click.echo(f'{e.total} row(s) failed validation; nothing was imported')
+        sys.exit(1)
+    except InsufficientFundsError as e:
+        db.session.rollback()
+        click.echo(f'{e}; nothing was imported')
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    click.echo(f'Imported {summary["imported"]} transactions in {elapsed:.2f}s '
+               f'({summary["imported"] / elapsed if elapsed else 0:,.0f} rows/s)')
+    for account, delta in summary['balances'].items():
+        click.echo(f'  {account}: {delta:+,.2f}')
+
+@app.cli.command('reconcile-spent')
+@click.option('--month', help='Month to reconcile as YYYY-MM. Defaults to the previous and the current month.')
+@click.option('--all-users', is_flag=True, help='Check every user, not only those who changed since the last run.')
+@click.option('--dry-run', is_flag=True, help='Report drifted budget items without fixing them.')
+def reconcile_spent_command(month, all_users, dry_run):
+    """Recompute budget item spent amounts from transactions and fix the ones that drifted."""
+    if month:
+        months = [datetime.strptime(month, '%Y-%m').date()]
+    else:
+        # Last month as well, so edits made after it ended are checked on the first run of the new month
+        current = date.today().replace(day=1)
+        months = [(current - timedelta(days=1)).replace(day=1), current]
+
+    for month in months:
+        if dry_run:
+            drifted = spent_amount_drift_query(month, None if all_users else unreconciled_user_ids(month)).all()
+            for row in drifted:
+                click.echo(f'budget item {row.id} (user {row.user_id}): {row.spent_amount or 0:.2f} -> {row.actual:.2f}')
+            click.echo(f'{len(drifted)} budget item(s) drifted in {month:%B %Y}')
+            continue
+
+        checked, drifted, fixed = reconcile_changed_users(month, all_users=all_users)
+        db.session.commit()
+        click.echo(f'Checked {checked} user(s), fixed {fixed} of {len(drifted)} drifted budget item(s) in {month:%B %Y}')
+
+@app.cli.command('archive-rows')
+@click.option('--batch-size', default=ARCHIVE_BATCH_ROWS, show_default=True,
+              help='Budgets and transactions moved per transaction.')
+def archive_rows_command(batch_size):
+    """Move archived budgets and transactions out of the hot tables in batches"""
+    totals = [0, 0, 0]
+    while True:
+        moved = archive_rows(batch_size=batch_size)
+        db.session.commit()
+        totals = [total + count for total, count in zip(totals, moved)]
+        if moved[0] < batch_size and moved[2] < batch_size:
+            break
+    click.echo(f'Moved {totals[0]} budget(s) with {totals[1]} item(s) and {totals[2]} transaction(s) to the archive tables')
+
+@app.cli.command('drain-mail')
+@click.option('--loop', is_flag=True, help='Keep draining in the foreground instead of sending one pass')
+def drain_mail_command(loop):
+    """Send queued mail now, for deployments that set MAIL_QUEUE_WORKER=false"""
+    if loop:
+        click.echo(f'Draining the mail queue every {app.config["MAIL_QUEUE_POLL_INTERVAL"]:g}s, Ctrl+C to stop')
+        MailQueueWorker().run()
+        return
+    total_claimed = total_sent = 0
+    while True:
+        claimed, sent = drain_mail_queue()
+        total_claimed += claimed
+        total_sent += sent
+        if claimed < app.config['MAIL_QUEUE_BATCH_SIZE']:
+            break
+    pending = db.session.scalar(pending_mail_count_query())
+    failed = db.session.scalar(db.select(db.func.count()).where(OutboundMail.next_attempt_at.is_(None)))
+    click.echo(f'Sent {total_sent} of {total_claimed} due message(s); {pending} queued, {failed} given up')
+
+@app.cli.command('load-fx-rates')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def load_fx_rates_command(path):
+    """Load exchange rates from a CSV file with date, currency and rate columns.
+
+    rate is the value of one unit of the currency in FX_BASE_CURRENCY. Rates already stored for the same
+    currency and date are replaced.
+    """
+    rates = {}
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for number, row in enumerate(csv.DictReader(f), start=1):
+            try:
+                currency = row['currency'].strip().upper()
+                if currency not in SUPPORTED_CURRENCIES:
+                    raise ValueError(f'unsupported currency {currency}')
+                rate = float(row['rate'])
+                if not rate > 0:
+                    raise ValueError('rate must be greater than zero')
+                rates[(currency, date.fromisoformat(row['date'].strip()))] = rate
+            except (KeyError, AttributeError, ValueError) as e:
+                click.echo(f'row {number}: {e}; nothing was loaded')
+                sys.exit(1)
+
+    keys = list(rates)
+    for start in range(0, len(keys), IMPORT_CHUNK_ROWS):
+        chunk = keys[start:start + IMPORT_CHUNK_ROWS]
+        db.session.execute(db.delete(FxRate).where(tuple_(FxRate.currency, FxRate.date).in_(chunk)))
+        db.session.execute(db.insert(FxRate), [
+            {'currency': currency, 'date': day, 'rate': rates[(currency, day)]} for currency, day in chunk
+        ])
+    db.session.commit()
+    fx_rate_cache.clear()
+    click.echo(f'Loaded {len(rates)} rate(s) in {app.config["FX_BASE_CURRENCY"]}')
+
+@app.cli.command('seed')
+@click.option('--users', default=10, show_default=True)
+@click.option('--transactions', default=1000, show_default=True, help='Transactions per user.')
+@click.option('--months', default=12, show_default=True, help='Months of budgets and transactions per user.')
+@click.option('--seed', 'random_seed', default=42, show_default=True, help='Same seed, same data.')
+@click.option('--until', help='Last day of generated activity as YYYY-MM-DD. Defaults to today.')
+@click.option('--prefix', default='seed', show_default=True, help='Usernames are PREFIX0, PREFIX1, ...')
+@click.option('--batch-rows', default=SEED_BATCH_ROWS, show_default=True, help='Rows per executemany batch.')
+def seed_command(users, transactions, months, random_seed, until, prefix, batch_rows):
+    """Generate a deterministic synthetic dataset for reproducing performance problems."""
+    until = date.fromisoformat(until) if until else date.today()
+    started = time.perf_counter()
+    try:
+        counts = seed_synthetic_data(users, transactions, months, random_seed, until, prefix=prefix,
+                                     batch_rows=batch_rows)
+    except ValueError as e:
+        db.session.rollback()
+        click.echo(str(e))
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    total = sum(counts.values())
+    click.echo(f'Wrote {total:,} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)')
+    for table, count in counts.items():
+        click.echo(f'  {table}: {count:,}')
+    click.echo(f'Users {prefix}0..{prefix}{users - 1} log in with the password {prefix}#Password1')
+
+@app.cli.command('check-query-plans')
+def check_query_plans():
+    """Fail if any route query falls back to a full table scan."""
+    db.create_all()
+    # Partial indexes only hold the rows a query is after, so scanning one is fine
+    partial_indexes = {index.name for table in db.metadata.tables.values() for index in table.indexes
+                       if index.dialect_options['sqlite']['where'] is not None}
+    failures = 0
+    for route, queries in route_queries(user_id=1).items():
+        for query in queries:
+            for statement, plan in explain_query_plan(query):
+                scans = [detail for detail in plan
+                         if detail.startswith('SCAN') and detail.split()[1] in db.metadata.tables
+                         and detail.split()[-1] not in partial_indexes]
+                if scans:
+                    failures += 1
+                    click.echo(f'FAIL {route}: {"; ".join(scans)}')
+                    click.echo(f'     {" ".join(statement.split())}')
+                else:
+                    click.echo(f'ok   {route}: {"; ".join(plan)}')
+    db.session.rollback()
+
+    if failures:
+        click.echo(f'\n{failures} query plan(s) use a full table scan')
+        sys.exit(1)
+    click.echo('\nAll route queries use an index')
 
 if __name__ == '__main__':
     init_db()
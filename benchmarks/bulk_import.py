@@ -0,0 +1,113 @@
+"""
+Bulk transaction import benchmark
+
+Generates a CSV statement, imports it through import_transactions() and reports
+rows per second. Also checks that spent amounts and balances moved by the
+imported totals.
+
+Usage:
+    python benchmarks/bulk_import.py [--rows 200000] [--chunk-rows 5000]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['METRICS_ENABLED'] = 'False'  # Would leave a metrics file per run in instance/metrics
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (app, db, User, Category, Transaction, Budget, BudgetItem, AccountBalance, IMPORT_CHUNK_ROWS,
+                 IMPORT_FIELDS, create_shared_categories, parse_import_rows, import_transactions)
+
+OPENING_BALANCE = Decimal(10 ** 9)
+
+
+def seed():
+    """Create one user with the shared categories, a fully budgeted current month and funded accounts"""
+    db.create_all()
+    user = User(username='benchmark', email='benchmark@example.com', default_currency='ZMW')
+    user.set_password('Benchmark#1')
+    db.session.add(user)
+    db.session.flush()
+
+    create_shared_categories()
+    categories = Category.query.filter_by(user_id=None).all()
+    budget = Budget(month=date.today().replace(day=1), total_amount=OPENING_BALANCE, user_id=user.id)
+    db.session.add(budget)
+    db.session.flush()
+    for category in categories:
+        if category.type == 'expense':
+            db.session.add(BudgetItem(budget_id=budget.id, category_id=category.id, planned_amount=10 ** 6, spent_amount=0))
+    for source in ('bank', 'mobile_money', 'cash'):
+        db.session.add(AccountBalance(user_id=user.id, source=source, currency='ZMW', amount=OPENING_BALANCE))
+    db.session.commit()
+    return user.id, categories
+
+
+def statement(rows, categories):
+    """CSV statement of rows transactions dated within the current month"""
+    rng = random.Random(42)
+    expense = [c.name for c in categories if c.type == 'expense']
+    income = [c.name for c in categories if c.type == 'income']
+    start = datetime.combine(date.today().replace(day=1), datetime.min.time())
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(IMPORT_FIELDS)
+    for i in range(rows):
+        is_expense = rng.random() < 0.8
+        writer.writerow([
+            (start + timedelta(seconds=rng.randrange(86400 * 27))).isoformat(sep=' '),
+            'expense' if is_expense else 'income',
+            f'{rng.uniform(1, 500):.2f}',
+            f'Statement line {i}',
+            rng.choice(expense if is_expense else income),
+            rng.choice(('bank', 'mobile_money', 'cash')),
+            'ZMW'
+        ])
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--chunk-rows', type=int, default=IMPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    with app.app_context():
+        user_id, categories = seed()
+        text = statement(args.rows, categories)
+
+        started = time.perf_counter()
+        rows = parse_import_rows(text, 'csv')
+        parsed = time.perf_counter()
+        summary = import_transactions(db.session.get(User, user_id), rows, chunk_rows=args.chunk_rows)
+        db.session.commit()
+        finished = time.perf_counter()
+
+        expenses = db.session.scalar(db.select(db.func.sum(Transaction.amount)).filter_by(type='expense'))
+        income = db.session.scalar(db.select(db.func.sum(Transaction.amount)).filter_by(type='income'))
+        spent = db.session.scalar(db.select(db.func.sum(BudgetItem.spent_amount)))
+        balances = db.session.scalar(db.select(db.func.sum(AccountBalance.amount)))
+
+    print(f'{summary["imported"]} rows: parse {parsed - started:.2f}s, validate + insert {finished - parsed:.2f}s, '
+          f'{summary["imported"] / (finished - started):,.0f} rows/s overall')
+    os.remove(DB_FILE)
+
+    expected_balances = 3 * OPENING_BALANCE + income - expenses
+    if spent != expenses or balances != expected_balances:
+        print(f'FAIL: spent {spent:.2f} vs {expenses:.2f}, balances {balances:.2f} vs {expected_balances:.2f}')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
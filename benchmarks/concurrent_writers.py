@@ -0,0 +1,136 @@
+"""
+Concurrent writer stress test
+
+Fires parallel create_transaction and delete_transaction requests at one user's
+budget item and bank balance, then checks that the stored spent amount and
+balance match the transactions that were committed. Exits non-zero on a mismatch
+or when a request fails, since a writer that lost a race shows up as a failed request.
+tests/test_concurrent_writers.py runs a small version of it under pytest.
+
+Usage:
+    python benchmarks/concurrent_writers.py [--threads 8] [--requests 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'stress.db')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+os.environ.setdefault('SECRET_KEY', 'stress')
+os.environ['METRICS_ENABLED'] = 'False'  # Would leave a metrics file per run in instance/metrics
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, User, Category, Transaction, Budget, BudgetItem, Saving, AccountBalance
+
+PASSWORD = 'Stress#Test1'
+OPENING_BALANCE = Decimal(10 ** 6)
+
+
+def seed():
+    db.create_all()
+    user = User(username='stress', email='stress@example.com', default_currency='ZMW')
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.flush()
+
+    category = Category(name='Food & Groceries', type='expense', user_id=user.id)
+    budget = Budget(month=date.today().replace(day=1), total_amount=OPENING_BALANCE, user_id=user.id)
+    db.session.add_all([category, budget])
+    db.session.flush()
+    item = BudgetItem(budget_id=budget.id, category_id=category.id, planned_amount=OPENING_BALANCE, spent_amount=0)
+    db.session.add(item)
+    db.session.add(AccountBalance(user_id=user.id, source='bank', currency='ZMW', amount=OPENING_BALANCE))
+    db.session.commit()
+    return category.id, item.id
+
+
+def writer(category_id, requests, errors):
+    client = app.test_client()
+    client.post('/login', data={'username': 'stress', 'password': PASSWORD})
+    for i in range(requests):
+        try:
+            if i % 5 == 4:
+                # Delete one of this user's transactions so reverts race with inserts
+                with app.app_context():
+                    transaction_id = db.session.scalar(db.select(Transaction.id).order_by(db.func.random()).limit(1))
+                if transaction_id:
+                    result = client.post(f'/transaction/delete/{transaction_id}').get_json()
+                    # Another writer deleting it first is an expected race, anything else is a failed request
+                    if not result['success'] and result['message'] != 'Transaction was already deleted':
+                        errors.append(result['message'])
+                continue
+            elif i % 3 == 0:
+                client.post('/transactions/create', data={
+                    'amount': '7', 'description': f'income {i}', 'type': 'income', 'source': 'bank'
+                })
+            else:
+                client.post('/transactions/create', data={
+                    'amount': '3', 'description': f'expense {i}', 'type': 'expense',
+                    'source': 'bank', 'category_id': str(category_id)
+                })
+            with client.session_transaction() as session:
+                errors.extend(message for category, message in session.pop('_flashes', []) if category == 'error')
+        except Exception as e:
+            errors.append(e)
+
+
+def run(threads, requests):
+    """Seed the database, fire the writers and return the stored totals next to the ones the transactions imply"""
+    with app.app_context():
+        category_id, item_id = seed()
+
+    errors = []
+    workers = [threading.Thread(target=writer, args=(category_id, requests, errors)) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        expenses = db.session.scalar(
+            db.select(db.func.coalesce(db.func.sum(Transaction.amount), 0)).filter_by(type='expense')
+        )
+        income = db.session.scalar(
+            db.select(db.func.coalesce(db.func.sum(Transaction.amount), 0)).filter_by(type='income')
+        )
+        return {
+            'elapsed': elapsed,
+            'errors': errors,
+            'committed': db.session.scalar(db.select(db.func.count(Transaction.id))),
+            'spent': db.session.get(BudgetItem, item_id).spent_amount,
+            'expenses': expenses,
+            'balance': db.session.scalar(db.select(AccountBalance.amount).filter_by(source='bank')),
+            'expected_balance': OPENING_BALANCE + income - expenses,
+            'last_logged': db.session.scalar(db.select(Saving.amount).order_by(Saving.id.desc()).limit(1)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help='requests per thread')
+    args = parser.parse_args()
+
+    result = run(args.threads, args.requests)
+    print(f'{args.threads} threads x {args.requests} requests in {result["elapsed"]:.2f}s, '
+          f'{result["committed"]} transactions committed, {len(result["errors"])} failed requests')
+    print(f'spent amount: {result["spent"]:.2f} (expected {result["expenses"]:.2f})')
+    print(f'bank balance: {result["balance"]:.2f} (expected {result["expected_balance"]:.2f}, '
+          f'last logged {result["last_logged"]:.2f})')
+
+    os.remove(DB_FILE)
+    if result['spent'] != result['expenses'] or result['balance'] != result['expected_balance'] or result['errors']:
+        print('FAIL: stored totals drifted from the committed transactions')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Dashboard snapshot benchmark
+
+Compares the per-request query count and latency of the dashboard snapshot
+against the query-per-field approach index() used before it.
+
+Usage:
+    python benchmarks/dashboard_snapshot.py [--transactions 10000] [--iterations 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['METRICS_ENABLED'] = 'False'  # Would leave a metrics file per run in instance/metrics
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import (app, db, User, Category, Transaction, Budget, BudgetItem, Saving, AccountBalance, Investment,
+                 create_shared_categories, get_dashboard_snapshot)
+
+
+def seed(transactions):
+    """Create one user with a current budget, savings history, investments and transactions"""
+    db.create_all()
+    user = User(username='benchmark', email='benchmark@example.com', default_currency='ZMW')
+    user.set_password('Benchmark#1')
+    db.session.add(user)
+    db.session.flush()
+
+    create_shared_categories()
+    categories = Category.query.filter_by(user_id=None).all()
+    expense_categories = [c for c in categories if c.type == 'expense']
+
+    budget = Budget(month=date.today().replace(day=1), total_amount=50000, user_id=user.id)
+    db.session.add(budget)
+    db.session.flush()
+    for category in expense_categories:
+        db.session.add(BudgetItem(budget_id=budget.id, category_id=category.id, planned_amount=1000, spent_amount=250))
+
+    start = datetime.now() - timedelta(days=365 * 3)
+    for i in range(transactions // 10):
+        db.session.add(Saving(type=('bank', 'mobile_money', 'cash')[i % 3], amount=1000 + i, user_id=user.id,
+                              date=start + timedelta(hours=i)))
+    for source in ('bank', 'mobile_money', 'cash'):
+        db.session.add(AccountBalance(user_id=user.id, source=source, currency='ZMW', amount=1000))
+    for i in range(20):
+        db.session.add(Investment(type='stocks', initial_value=1000, current_value=1100 + i, user_id=user.id))
+
+    db.session.bulk_insert_mappings(Transaction, [{
+        'date': start + timedelta(minutes=i * 15),
+        'type': 'expense',
+        'amount': 10,
+        'description': f'Transaction {i}',
+        'category_id': expense_categories[i % len(expense_categories)].id,
+        'user_id': user.id,
+        'currency': 'ZMW',
+        'source': 'bank'
+    } for i in range(transactions)])
+    db.session.commit()
+    return user.id
+
+
+def legacy_dashboard(user):
+    """The queries index() issued before the dashboard snapshot"""
+    current_month = date.today().replace(day=1)
+    current_budget = Budget.query.filter_by(user_id=user.id, month=current_month, archived=False).first()
+    if current_budget:
+        budget_items = BudgetItem.query.filter_by(budget_id=current_budget.id, archived=False).all()
+        sum(item.spent_amount for item in budget_items)
+    for source in ('bank', 'mobile_money', 'cash'):
+        Saving.query.filter_by(user_id=user.id, type=source).order_by(Saving.date.desc()).first()
+    Saving.query.filter_by(user_id=user.id).order_by(Saving.date.desc()).first()
+    investments = Investment.query.filter_by(user_id=user.id).all()
+    sum(inv.current_value for inv in investments)
+    sum(inv.initial_value for inv in investments)
+    recent_transactions = Transaction.query.filter_by(user_id=user.id)\
+        .order_by(Transaction.date.desc()).limit(5).all()
+    # The template lazy-loads each transaction's category
+    for transaction in recent_transactions:
+        transaction.category
+
+
+def measure(label, fn, user, iterations):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    timings = []
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for _ in range(iterations):
+            db.session.expire_all()
+            started = time.perf_counter()
+            fn(user)
+            timings.append(time.perf_counter() - started)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    timings.sort()
+    print(f'{label:<12} queries/request: {len(statements) / iterations:5.1f}   '
+          f'p50: {timings[len(timings) // 2] * 1000:7.3f} ms   '
+          f'p95: {timings[int(len(timings) * 0.95)] * 1000:7.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transactions', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    with app.app_context():
+        user_id = seed(args.transactions)
+        user = db.session.get(User, user_id)
+        print(f'{args.transactions} transactions, {args.iterations} iterations')
+        measure('legacy', legacy_dashboard, user, args.iterations)
+        measure('snapshot', get_dashboard_snapshot, user, args.iterations)
+
+    os.remove(DB_FILE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Login throughput benchmark
+
+Runs a burst of concurrent logins at each password-hash cost and reports logins per second and
+login latency, alongside the latency of a cheap page requested during the burst to show how much
+hashing slows everything else down.
+
+Usage:
+    python benchmarks/login_throughput.py [--logins 64] [--concurrency 16] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['METRICS_ENABLED'] = 'False'  # Would leave a metrics file per run in instance/metrics
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from app import app, db, User, password_hash_method
+
+PASSWORD = 'Benchmark#1'
+
+# (PASSWORD_HASH_METHOD, PASSWORD_HASH_COST) pairs, cheapest first
+SETTINGS = [
+    ('pbkdf2:sha256', 100000),
+    ('pbkdf2:sha256', 260000),
+    ('pbkdf2:sha256', 600000),
+    ('scrypt', 16384),
+    ('scrypt', 32768),
+]
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))] * 1000
+
+
+def burst(logins, concurrency):
+    """Run logins concurrent logins while one thread keeps fetching the login page"""
+    login_timings = []
+    page_timings = []
+    remaining = iter(range(logins))
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def login_worker():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            client = app.test_client()
+            started = time.perf_counter()
+            response = client.post('/login', data={'username': 'benchmark', 'password': PASSWORD})
+            elapsed = time.perf_counter() - started
+            assert response.status_code == 302, response.status_code
+            with lock:
+                login_timings.append(elapsed)
+
+    def page_worker():
+        client = app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get('/login')
+            page_timings.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=login_worker) for _ in range(concurrency)]
+    page_thread = threading.Thread(target=page_worker)
+    started = time.perf_counter()
+    page_thread.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    page_thread.join()
+    return elapsed, login_timings, page_timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=app.config['PASSWORD_HASH_WORKERS'],
+                        help='PASSWORD_HASH_WORKERS for the hashing pool')
+    args = parser.parse_args()
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['PASSWORD_HASH_WORKERS'] = args.workers
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='benchmark', email='benchmark@example.com')
+        db.session.add(user)
+        db.session.commit()
+
+        print(f'{args.logins} logins, {args.concurrency} concurrent, {args.workers} hashing workers, '
+              f'{os.cpu_count()} CPUs')
+        print(f'{"method":<24} {"logins/s":>9} {"login p50":>11} {"login p95":>11} {"page p50":>10} {"page p95":>10}')
+        for method, cost in SETTINGS:
+            app.config['PASSWORD_HASH_METHOD'] = method
+            app.config['PASSWORD_HASH_COST'] = cost
+            # Store a hash at the current setting so logins measure verification, not the one-off rehash
+            user.password_hash = generate_password_hash(PASSWORD, password_hash_method())
+            db.session.commit()
+
+            elapsed, login_timings, page_timings = burst(args.logins, args.concurrency)
+            print(f'{password_hash_method():<24} {len(login_timings) / elapsed:9.1f} '
+                  f'{percentile(login_timings, 0.5):8.1f} ms {percentile(login_timings, 0.95):8.1f} ms '
+                  f'{percentile(page_timings, 0.5):7.1f} ms {percentile(page_timings, 0.95):7.1f} ms')
+
+    os.remove(DB_FILE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+End-to-end route benchmark
+
+Seeds a database at each scale (transactions per user) and drives the main pages, transaction writes and
+both CSV exports through the Flask test client from several threads. Reports p50/p95/p99 latency,
+requests per second and SQL statements per request for each route, and saves the results as JSON so a
+later run can be compared against them.
+
+Usage:
+    python benchmarks/routes.py [--scales 1k,100k,1M] [--threads 4] [--requests 200] [--export-requests 5]
+                                [--output route_baseline.json] [--compare route_baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_FILE}'
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['PASSWORD_HASH_COST'] = '1000'  # Logins are not what is being measured
+os.environ['MAIL_QUEUE_WORKER'] = 'False'
+os.environ['METRICS_ENABLED'] = 'False'  # Would leave a metrics file per run in instance/metrics
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import event
+
+import app as application
+from app import app, db, User, Transaction, Budget, BudgetItem, seed_synthetic_data
+
+PREFIX = 'benchmark'
+PASSWORD = f'{PREFIX}#Password1'  # What seed_synthetic_data gives every user
+MONTHS = 24  # Months of history the transactions are spread over
+
+# name -> (method, path, form); path may be a callable taking the benchmark state
+ROUTES = [
+    ('index', 'GET', '/', None),
+    ('transactions', 'GET', '/transactions', None),
+    ('budget', 'GET', '/budget', None),
+    ('finance', 'GET', '/finance', None),
+    ('create_transaction', 'POST', '/transactions/create', lambda state: {
+        'amount': '1', 'description': 'benchmark', 'type': 'expense', 'source': 'bank',
+        'category_id': str(state['category_id'])
+    }),
+    ('delete_transaction', 'POST', lambda state: f'/transaction/delete/{state["deletable"].pop()}', None),
+    ('export_transactions', 'GET', '/export_transactions', None),
+    ('export_budgets', 'GET', '/export_budgets', None),
+]
+EXPORT_ROUTES = {'export_transactions', 'export_budgets'}
+
+
+def parse_scale(label):
+    """'1k' -> 1000, '1M' -> 1000000"""
+    multiplier = {'k': 10 ** 3, 'M': 10 ** 6}.get(label[-1], 1)
+    return int(float(label.rstrip('kM')) * multiplier)
+
+
+def seed(transactions, users):
+    """
+    Generate users with the `flask seed` generator, each with a budget for every month of history
+    Returns what the routes need: the first user's name, a category in their current budget and the ids of
+    their newest expenses, which are in the current month so deleting one also reverts a budget item.
+    """
+    db.drop_all()
+    db.create_all()
+    seed_synthetic_data(users, transactions, MONTHS, random_seed=42, until=date.today(), prefix=PREFIX)
+    # Caches are looked up rather than imported so the script also runs against an older tree without them
+    for name in ('dashboard_cache', 'user_cache'):
+        if hasattr(application, name):
+            getattr(application, name).clear()
+
+    user = User.query.filter_by(username=f'{PREFIX}0').one()
+    category_id = db.session.scalar(
+        db.select(BudgetItem.category_id).join(Budget)
+        .where(Budget.user_id == user.id, Budget.month == date.today().replace(day=1)).limit(1)
+    )
+    deletable = db.session.scalars(
+        db.select(Transaction.id).filter_by(user_id=user.id, type='expense')
+        .order_by(Transaction.id.desc()).limit(10000)
+    ).all()
+    return {'user': user.username, 'category_id': category_id, 'deletable': deletable}
+
+
+def run_route(name, method, path, form, state, requests, threads):
+    """Send requests to one route from threads logged-in clients; returns its stats"""
+    local = threading.local()
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        local.queries = getattr(local, 'queries', 0) + 1
+
+    timings = []
+    queries = []
+    errors = []
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+    clients = []
+    for _ in range(threads):
+        client = app.test_client()
+        client.post('/login', data={'username': state['user'], 'password': PASSWORD})
+        clients.append(client)
+
+    def worker(client):
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+                url = path(state) if callable(path) else path
+            data = form(state) if form else None
+            local.queries = 0
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            response.get_data()  # Exports stream, so read the whole body
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                failed = True
+            elif name == 'delete_transaction':
+                failed = not (response.get_json(silent=True) or {}).get('success')
+            elif method == 'POST':
+                with client.session_transaction() as session:
+                    failed = any(category == 'error' for category, _ in session.pop('_flashes', []))
+            else:
+                failed = False
+            with lock:
+                timings.append(elapsed)
+                queries.append(local.queries)
+                if failed:
+                    errors.append(url)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        workers = [threading.Thread(target=worker, args=(client,)) for client in clients]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    return {
+        'requests': len(timings),
+        'errors': len(errors),
+        'p50_ms': percentile(timings, 0.50),
+        'p95_ms': percentile(timings, 0.95),
+        'p99_ms': percentile(timings, 0.99),
+        'requests_per_second': round(len(timings) / elapsed, 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+    }
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return round(timings[min(len(timings) - 1, int(len(timings) * fraction))] * 1000, 2)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_scale(label, result, baseline=None):
+    print(f'\n{label} transactions per user (seeded in {result["seed_seconds"]:.1f}s)')
+    print(f'{"route":<20} {"requests":>8} {"errors":>6} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+          f'{"req/s":>8} {"queries":>8}')
+    for name, stats in result['routes'].items():
+        line = (f'{name:<20} {stats["requests"]:8d} {stats["errors"]:6d} {stats["p50_ms"]:9.2f} '
+                f'{stats["p95_ms"]:9.2f} {stats["p99_ms"]:9.2f} {stats["requests_per_second"]:8.1f} '
+                f'{stats["queries_per_request"]:8.1f}')
+        before = (baseline or {}).get(label, {}).get('routes', {}).get(name)
+        if before:
+            line += (f'   p95 {change(before["p95_ms"], stats["p95_ms"])}, '
+                     f'req/s {change(before["requests_per_second"], stats["requests_per_second"])}, '
+                     f'queries {stats["queries_per_request"] - before["queries_per_request"]:+.1f}')
+        print(line)
+
+
+def change(before, after):
+    return f'{(after - before) / before * 100:+.0f}%' if before else 'n/a'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1k,100k,1M', help='transactions per user, comma separated')
+    parser.add_argument('--users', type=int, default=1, help='users seeded at each scale')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='requests per page or write route')
+    parser.add_argument('--export-requests', type=int, default=5, help='requests per export route')
+    parser.add_argument('--routes', help='comma separated subset of: ' + ', '.join(name for name, *_ in ROUTES))
+    parser.add_argument('--output', default='route_baseline.json', help='where to save the results')
+    parser.add_argument('--compare', help='results saved by an earlier run to show changes against')
+    args = parser.parse_args()
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    selected = set(args.routes.split(',')) if args.routes else {name for name, *_ in ROUTES}
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['scales']
+
+    results = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'threads': args.threads,
+        'scales': {},
+    }
+    print(f'commit {results["commit"]}, {args.threads} threads, {os.cpu_count()} CPUs')
+    for label in args.scales.split(','):
+        with app.app_context():
+            started = time.perf_counter()
+            state = seed(parse_scale(label), args.users)
+            seed_seconds = time.perf_counter() - started
+
+        routes = {}
+        for name, method, path, form in ROUTES:
+            if name in selected:
+                requests = args.export_requests if name in EXPORT_ROUTES else args.requests
+                routes[name] = run_route(name, method, path, form, state, requests, args.threads)
+        results['scales'][label] = {'seed_seconds': round(seed_seconds, 2), 'routes': routes}
+        print_scale(label, results['scales'][label], baseline)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nSaved to {args.output}')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(DB_FILE + suffix):
+            os.remove(DB_FILE + suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+SQLite engine profile benchmark
+
+Starts several writer and reader processes against one database file, the way mod_wsgi runs the app,
+and compares SQLite's defaults with the app's engine profile (WAL, synchronous=NORMAL, busy_timeout,
+cache and mmap sizes). Writers create transactions and readers load the transactions page, each as their
+own user. Reports committed writes and page loads per second, latencies, and writes that failed.
+
+Usage:
+    python benchmarks/sqlite_profile.py [--writers 4] [--readers 4] [--duration 10]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'Profile#Test1'
+
+# Engine settings per profile; 'sqlite defaults' is what the app ran with before it had a profile
+PROFILES = {
+    'sqlite defaults': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_BUSY_TIMEOUT': '5000',  # The sqlite3 module's default timeout
+        'SQLITE_CACHE_SIZE': '2000',
+        'SQLITE_MMAP_SIZE': '0',
+    },
+    'app profile': {},
+}
+
+
+def load_app(db_file, settings):
+    """Import the app in this process with the given engine settings"""
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_file}'
+    os.environ.setdefault('SECRET_KEY', 'profile')
+    os.environ['PASSWORD_HASH_COST'] = '1000'  # Logins are not what is being measured
+    os.environ['MAIL_QUEUE_WORKER'] = 'False'
+    os.environ['METRICS_ENABLED'] = 'False'  # Would leave metrics files per process in instance/metrics
+    for key in PROFILES['sqlite defaults']:
+        os.environ.pop(key, None)
+    os.environ.update(settings)
+    sys.path.insert(0, ROOT)
+    import app
+    app.app.config['WTF_CSRF_ENABLED'] = False
+    app.app.logger.disabled = True  # Failed requests are counted, not printed
+    return app
+
+
+def seed(db_file, settings, users):
+    from decimal import Decimal
+
+    app = load_app(db_file, settings)
+    with app.app.app_context():
+        app.db.create_all()
+        app.create_shared_categories()
+        category = app.Category.query.filter_by(user_id=None, type='expense').first()
+        for i in range(users):
+            user = app.User(username=f'profile{i}', email=f'profile{i}@example.com', default_currency='ZMW')
+            user.set_password(PASSWORD)
+            app.db.session.add(user)
+            app.db.session.flush()
+            budget = app.Budget(month=date.today().replace(day=1), total_amount=Decimal(10 ** 6), user_id=user.id)
+            app.db.session.add(budget)
+            app.db.session.flush()
+            app.db.session.add(app.BudgetItem(budget_id=budget.id, category_id=category.id,
+                                              planned_amount=Decimal(10 ** 6), spent_amount=0))
+            app.db.session.add(app.AccountBalance(user_id=user.id, source='bank', currency='ZMW',
+                                                  amount=Decimal(10 ** 6)))
+        app.db.session.commit()
+        return category.id
+
+
+def worker(db_file, settings, role, index, category_id, ready, duration, results):
+    app = load_app(db_file, settings)
+    client = app.app.test_client()
+    client.post('/login', data={'username': f'profile{index}', 'password': PASSWORD})
+    ready.wait()  # Start together once every process has logged in
+
+    timings = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        if role == 'writer':
+            response = client.post('/transactions/create', data={
+                'amount': '1', 'description': 'profile', 'type': 'expense',
+                'source': 'bank', 'category_id': str(category_id)
+            })
+            timings.append(time.perf_counter() - started)
+            # create_transaction reports failures by flashing; drop them so the session cookie stays small
+            with client.session_transaction() as session:
+                session.pop('_flashes', None)
+        else:
+            response = client.get('/transactions')
+            timings.append(time.perf_counter() - started)
+            errors += response.status_code != 200
+    results.put((role, timings, errors))
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))] * 1000 if timings else 0.0
+
+
+def run(name, settings, writers, readers, duration):
+    db_file = os.path.join(tempfile.mkdtemp(), 'profile.db')
+    context = multiprocessing.get_context('spawn')  # Each process imports the app with its own settings
+    seeder = context.Pool(1)
+    category_id = seeder.apply(seed, (db_file, settings, writers + readers))
+    seeder.close()
+    seeder.join()
+
+    roles = [('writer', i) for i in range(writers)] + [('reader', writers + i) for i in range(readers)]
+    ready = context.Barrier(len(roles) + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(db_file, settings, role, index, category_id,
+                                             ready, duration, results))
+        for role, index in roles
+    ]
+    for process in processes:
+        process.start()
+    ready.wait()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    write_timings = [t for role, timings, _ in collected if role == 'writer' for t in timings]
+    read_timings = [t for role, timings, _ in collected if role == 'reader' for t in timings]
+    read_errors = sum(errors for role, _, errors in collected if role == 'reader')
+
+    import sqlite3
+    connection = sqlite3.connect(db_file)
+    committed = connection.execute("SELECT COUNT(*) FROM \"transaction\"").fetchone()[0]
+    connection.close()
+
+    print(f'{name:<16} {committed / duration:9.1f} {len(write_timings) - committed:7d} '
+          f'{percentile(write_timings, 0.5):7.1f} ms {percentile(write_timings, 0.95):7.1f} ms '
+          f'{len(read_timings) / duration:9.1f} {read_errors:7d} '
+          f'{percentile(read_timings, 0.5):7.1f} ms {percentile(read_timings, 0.95):7.1f} ms')
+
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10, help='seconds each profile runs for')
+    args = parser.parse_args()
+
+    print(f'{args.writers} writer and {args.readers} reader processes, {args.duration:g}s per profile, '
+          f'{os.cpu_count()} CPUs')
+    print(f'{"profile":<16} {"writes/s":>9} {"failed":>7} {"write p50":>10} {"write p95":>10} '
+          f'{"reads/s":>9} {"failed":>7} {"read p50":>10} {"read p95":>10}')
+    for name, settings in PROFILES.items():
+        run(name, settings, args.writers, args.readers, args.duration)
+
+
+if __name__ == '__main__':
+    main()
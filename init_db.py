@@ -1,3 +1,7 @@
+import os
+
+os.environ.setdefault('METRICS_ENABLED', 'False')  # Would leave a metrics file per run in instance/metrics
+
 from app import init_db
 
 if __name__ == '__main__':
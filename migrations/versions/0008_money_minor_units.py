@@ -0,0 +1,47 @@
+"""money minor units
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 19:52:04.118230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+# Amount columns by table, with whether they are nullable
+MONEY_COLUMNS = {
+    'transaction': {'amount': False},
+    'budget': {'total_amount': False},
+    'budget_item': {'planned_amount': False, 'spent_amount': True},
+    'saving': {'amount': False},
+    'account_balance': {'amount': False},
+    'investment': {'initial_value': False, 'current_value': False},
+}
+
+
+def upgrade():
+    for table, columns in MONEY_COLUMNS.items():
+        # Convert the stored amounts to ngwee/cents before the column type changes
+        assignments = ', '.join(f'{column} = CAST(ROUND({column} * 100) AS INTEGER)' for column in columns)
+        op.execute(f'UPDATE "{table}" SET {assignments}')
+
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column, nullable in columns.items():
+                batch_op.alter_column(column, existing_type=sa.Float(), type_=sa.Integer(), existing_nullable=nullable)
+
+
+def downgrade():
+    for table, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column, nullable in columns.items():
+                batch_op.alter_column(column, existing_type=sa.Integer(), type_=sa.Float(), existing_nullable=nullable)
+
+        assignments = ', '.join(f'{column} = {column} / 100.0' for column in columns)
+        op.execute(f'UPDATE "{table}" SET {assignments}')
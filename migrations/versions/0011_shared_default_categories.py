@@ -0,0 +1,105 @@
+"""shared default categories
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 19:48:47.891141
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+# Category.get_default_categories() as of this revision
+DEFAULT_CATEGORIES = [
+    ('Salary', 'income'), ('Freelance', 'income'), ('Investment', 'income'), ('Business', 'income'),
+    ('Rental Income', 'income'),
+    ('Housing', 'expense'), ('Utilities', 'expense'), ('Transportation', 'expense'), ('Food & Groceries', 'expense'),
+    ('Healthcare', 'expense'), ('Entertainment', 'expense'), ('Shopping', 'expense'), ('Education', 'expense'),
+    ('Communication', 'expense'), ('Personal Care', 'expense'), ('Charity & Gifts', 'expense'),
+    ('Insurance', 'expense'), ('Debt Payment', 'expense'),
+]
+
+# Per-user category rows that duplicate a shared default by name and type
+PER_USER_COPY = '''
+    SELECT c.id AS copy_id, s.id AS shared_id
+    FROM category c JOIN category s ON s.user_id IS NULL AND s.name = c.name AND s.type = c.type
+    WHERE c.user_id IS NOT NULL
+'''
+
+
+def upgrade():
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('overrides_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('hidden', sa.Boolean(), server_default=sa.text('0'), nullable=False))
+        batch_op.alter_column('user_id',
+               existing_type=sa.INTEGER(),
+               nullable=True)
+        batch_op.create_index('ix_category_user_overrides', ['user_id', 'overrides_id'], unique=False)
+        batch_op.create_foreign_key('fk_category_overrides_id', 'category', ['overrides_id'], ['id'])
+
+    # Shared categories are used by every user, so the in-use check needs the user in the index
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_category')
+        batch_op.create_index('ix_transaction_category_user', ['category_id', 'user_id'], unique=False)
+
+    category = sa.table('category', sa.column('name'), sa.column('type'), sa.column('user_id'),
+                        sa.column('is_default'), sa.column('hidden'))
+    op.bulk_insert(category, [
+        {'name': name, 'type': type, 'user_id': None, 'is_default': True, 'hidden': False}
+        for name, type in DEFAULT_CATEGORIES
+    ])
+
+    # Point everything at the shared rows, then drop the per-user copies
+    for table in ('transaction', 'budget_item'):
+        op.execute(f'''
+            UPDATE "{table}" SET category_id = (
+                SELECT shared_id FROM ({PER_USER_COPY}) WHERE copy_id = "{table}".category_id
+            )
+            WHERE category_id IN (SELECT copy_id FROM ({PER_USER_COPY}))
+        ''')
+    op.execute(f'DELETE FROM category WHERE id IN (SELECT copy_id FROM ({PER_USER_COPY}))')
+
+    # Category ids changed, so lists cached in browsers are stale
+    op.execute('UPDATE "user" SET category_version = category_version + 1')
+
+
+def downgrade():
+    # Give every user their own copy of the shared rows they can see, and drop hidden flags
+    op.execute('''
+        INSERT INTO category (name, type, user_id, is_default, hidden)
+        SELECT s.name, s.type, u.id, 1, 0 FROM category s, "user" u
+        WHERE s.user_id IS NULL AND NOT EXISTS (
+            SELECT 1 FROM category o WHERE o.user_id = u.id AND o.overrides_id = s.id
+        )
+    ''')
+    for table, owner in (('transaction', '"transaction".user_id'),
+                         ('budget_item', '(SELECT user_id FROM budget WHERE budget.id = budget_item.budget_id)')):
+        op.execute(f'''
+            UPDATE "{table}" SET category_id = (
+                SELECT c.id FROM category c JOIN category s ON s.name = c.name AND s.type = c.type
+                WHERE s.id = "{table}".category_id AND c.user_id = {owner} AND c.overrides_id IS NULL
+            )
+            WHERE category_id IN (SELECT id FROM category WHERE user_id IS NULL)
+        ''')
+    op.execute('DELETE FROM category WHERE hidden = 1')
+    op.execute('DELETE FROM category WHERE user_id IS NULL')
+    op.execute('UPDATE "user" SET category_version = category_version + 1')
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_category_user')
+        batch_op.create_index('ix_transaction_category', ['category_id'], unique=False)
+
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_category_overrides_id', type_='foreignkey')
+        batch_op.drop_index('ix_category_user_overrides')
+        batch_op.alter_column('user_id',
+               existing_type=sa.INTEGER(),
+               nullable=False)
+        batch_op.drop_column('hidden')
+        batch_op.drop_column('overrides_id')
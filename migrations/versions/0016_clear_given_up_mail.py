@@ -0,0 +1,25 @@
+"""clear given up mail
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-17 21:40:07.529163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0016'
+down_revision = '0015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Messages given up on before their body was cleared still hold a live reset link
+    op.execute("UPDATE outbound_mail SET body = '' WHERE next_attempt_at IS NULL")
+
+
+def downgrade():
+    pass
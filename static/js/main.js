@@ -39,3 +39,38 @@ document.addEventListener('DOMContentLoaded', function() {
         }, 5000);
     }
 });
+
+// Fetch a category list, reusing the copy in local storage while its version is current
+function fetchCategories(url, userId, version) {
+    const key = `categories:${userId}:${url}`;
+    let cached = null;
+    try {
+        cached = JSON.parse(localStorage.getItem(key));
+    } catch (e) {
+        cached = null;
+    }
+    if (cached && cached.version === version) {
+        return Promise.resolve(cached.categories);
+    }
+
+    const headers = cached && cached.etag ? {'If-None-Match': cached.etag} : {};
+    return fetch(url, {headers: headers})
+        .then(response => {
+            if (response.status === 304) {
+                localStorage.setItem(key, JSON.stringify({...cached, version: version}));
+                return cached.categories;
+            }
+            if (!response.ok) {
+                throw new Error(`Failed to load categories (${response.status})`);
+            }
+            const etag = response.headers.get('ETag');
+            return response.json().then(categories => {
+                try {
+                    localStorage.setItem(key, JSON.stringify({version: version, etag: etag, categories: categories}));
+                } catch (e) {
+                    // Storage full or disabled, the list is still returned
+                }
+                return categories;
+            });
+        });
+}
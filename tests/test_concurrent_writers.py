@@ -0,0 +1,22 @@
+"""
+Concurrent transaction writes keep the budget item's spent amount and the bank balance equal to the
+transactions that were committed. A small run of benchmarks/concurrent_writers.py, which is the larger stress run.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import concurrent_writers
+
+
+def test_concurrent_writes_keep_totals_consistent():
+    try:
+        result = concurrent_writers.run(threads=6, requests=30)
+    finally:
+        os.remove(concurrent_writers.DB_FILE)
+
+    assert not result['errors']
+    assert result['committed'] > 0
+    assert result['spent'] == result['expenses']
+    assert result['balance'] == result['expected_balance']
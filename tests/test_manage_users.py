@@ -0,0 +1,37 @@
+"""
+scripts/manage_users picks inactive users from live and archived data alike, so a user whose recent
+transactions or budgets were moved to the archive tables is not purged as inactive.
+"""
+import os
+import sqlite3
+from datetime import date
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'manage_users')
+loader = SourceFileLoader('manage_users', SCRIPT)
+manage_users = module_from_spec(spec_from_loader('manage_users', loader))
+loader.exec_module(manage_users)
+
+SCHEMA = '''
+    CREATE TABLE "user" (id INTEGER PRIMARY KEY);
+    CREATE TABLE "transaction" (id INTEGER PRIMARY KEY, user_id INTEGER, date DATETIME);
+    CREATE TABLE "archived_transaction" (id INTEGER PRIMARY KEY, user_id INTEGER, date DATETIME);
+    CREATE TABLE "saving" (id INTEGER PRIMARY KEY, user_id INTEGER, date DATETIME);
+    CREATE TABLE "budget" (id INTEGER PRIMARY KEY, user_id INTEGER, month DATE);
+    CREATE TABLE "archived_budget" (id INTEGER PRIMARY KEY, user_id INTEGER, month DATE);
+'''
+
+def test_recent_archived_data_keeps_user_active():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(SCHEMA)
+    conn.executemany('INSERT INTO "user" (id) VALUES (?)', [(1,), (2,), (3,), (4,)])
+    # 1 only has old data, 2 and 3 only have recent data in the archive tables, 4 has nothing
+    conn.execute('INSERT INTO "transaction" (user_id, date) VALUES (1, ?)', ('2020-03-04 10:00:00',))
+    conn.execute('INSERT INTO "archived_transaction" (user_id, date) VALUES (1, ?)', ('2020-02-01 09:00:00',))
+    conn.execute('INSERT INTO "archived_transaction" (user_id, date) VALUES (2, ?)', ('2026-09-15 12:00:00',))
+    conn.execute('INSERT INTO "archived_budget" (user_id, month) VALUES (3, ?)', ('2026-09-01',))
+
+    since = date(2026, 1, 1)
+    assert manage_users.inactive_user_ids(conn, since) == [1]
+    assert manage_users.inactive_user_ids(conn, since, include_empty=True) == [1, 4]